@@ -4,6 +4,18 @@ from typing import List, Tuple, Optional
 class QueryRequest(BaseModel):
     query: str
     history: Optional[List[Tuple[str, str]]] = []
+    # server-side conversation; when set, history is kept by the server and ignored here
+    session_id: Optional[str] = None
+    # admission priority class, "interactive" unless set
+    priority: Optional[str] = None
+
+class BatchQuestion(BaseModel):
+    id: Optional[str] = None  # defaults to the question's position in the batch
+    query: str
+
+class BatchQueryRequest(BaseModel):
+    questions: List[BatchQuestion]
+    max_parallel: Optional[int] = None
 
 class FeedbackRequest(BaseModel):
     query: str
@@ -1,23 +1,240 @@
-from fastapi import APIRouter
+import os
+import json
+import shutil
+import asyncio
+from typing import List
+from contextlib import aclosing
+from fastapi import APIRouter, File, Form, HTTPException, Request, UploadFile
 # from app.core.inference import answer_query
-from app.core.inference import generate_answer_stream
+from app.core.inference import (
+    generate_answer_stream, generation_stats, inflight_generations, answer_batch, ASK_BATCH_CONCURRENCY, GenerationError
+)
 from fastapi.responses import StreamingResponse
 from app.core.feedback import store_feedback
-from app.api.dependencies import QueryRequest, FeedbackRequest
+from app.core.retriever import query_embedding_cache
+from app.core.answer_cache import answer_cache
+from app.core.sessions import session_store
+from app.core.metrics import RequestTimer
+from app.core.ingest_jobs import ingest_jobs
+from app.core.admission import admission, QueueFullError, QueuePosition, DEFAULT_PRIORITY_CLASS, BATCH_PRIORITY_CLASS
+from app.core.stream_markers import render_queue_marker
+from app.api.dependencies import QueryRequest, BatchQueryRequest, FeedbackRequest
+
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv('ASK_BATCH_MAX_QUESTIONS', '1000'))
+INGEST_EVENT_POLL_INTERVAL = 0.5
 
 router = APIRouter()
 
+def _queue_full():
+    return HTTPException(status_code=429, detail="Too many requests waiting for the model, try again shortly",
+                         headers={"Retry-After": "1"})
+
+def _check_admission(priority_class):
+    """Fail fast instead of letting a request queue behind an overloaded model server"""
+    if priority_class not in admission.priorities:
+        raise HTTPException(status_code=422, detail=f"Unknown priority class '{priority_class}'")
+    if not admission.has_capacity():
+        admission.reject(priority_class)
+        raise _queue_full()
+
+def _reserve_admission(priority_class):
+    """Hold a place in the model queue before any retrieval work, so overflow gets a 429 instead of a busy answer"""
+    try:
+        return admission.reserve(priority_class)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except QueueFullError:
+        raise _queue_full()
+
+def _render_chunk(chunk):
+    # queue updates travel in-band as a record-separator prefixed line the frontend strips
+    if isinstance(chunk, QueuePosition):
+        return render_queue_marker(chunk.position)
+    if isinstance(chunk, GenerationError):
+        return chunk.message
+    return chunk
+
+async def _wait_for_disconnect(request: Request):
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+async def _stream_until_disconnect(tokens, request: Request):
+    """Relay chunks from `tokens`, aborting it as soon as the client goes away"""
+    watcher = asyncio.create_task(_wait_for_disconnect(request))
+    try:
+        async with aclosing(tokens):
+            while True:
+                next_chunk = asyncio.ensure_future(tokens.__anext__())
+                await asyncio.wait({next_chunk, watcher}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_chunk.done():
+                    # client disconnected while waiting on Ollama
+                    next_chunk.cancel()
+                    try:
+                        await next_chunk
+                    except (asyncio.CancelledError, StopAsyncIteration):
+                        pass
+                    break
+                try:
+                    chunk = next_chunk.result()
+                except StopAsyncIteration:
+                    break
+                yield _render_chunk(chunk)
+    except Exception as e:
+        yield f"Error: {type(e).__name__} -  {str(e)}"
+    finally:
+        watcher.cancel()
+
+async def _error_stream(message):
+    yield message
+
 @router.post("/ask")
-async def ask(payload: QueryRequest):
-    def event_stream():
-        try:
-            for chunk in generate_answer_stream(payload.query, payload.history):
-                yield chunk
-        except Exception as e:
-            yield f"Error: {type(e).__name__} -  {str(e)}"
-    
-    # response = generate_answer_stream(payload.query)
-    return StreamingResponse(event_stream(), media_type="text/plain")
+async def ask(payload: QueryRequest, request: Request):
+    priority_class = payload.priority or DEFAULT_PRIORITY_CLASS
+    ticket = _reserve_admission(priority_class)
+    timer = RequestTimer()
+    # from here on the stream owns the ticket and releases it however it ends
+    tokens = generate_answer_stream(payload.query, payload.history, payload.session_id, timer=timer,
+                                    priority_class=priority_class, ticket=ticket)
+
+    # run retrieval and prompt building before responding so their timings can go in the headers
+    try:
+        await tokens.__anext__()  # PROMPT_READY
+    except Exception as e:
+        await tokens.aclose()
+        return StreamingResponse(_error_stream(f"Error: {type(e).__name__} -  {str(e)}"), media_type="text/plain")
+
+    return StreamingResponse(
+        _stream_until_disconnect(tokens, request),
+        media_type="text/plain",
+        headers={"Server-Timing": timer.server_timing()}
+    )
+
+async def _ndjson_results(results):
+    try:
+        async with aclosing(results):
+            async for result in results:
+                yield json.dumps(result) + "\n"
+    except Exception as e:
+        yield json.dumps({"error": f"{type(e).__name__} - {str(e)}"}) + "\n"
+
+@router.post("/ask_batch")
+async def ask_batch(payload: BatchQueryRequest, request: Request):
+    """Answer many questions in one request, streaming one NDJSON line per answer as it completes"""
+    if len(payload.questions) > ASK_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=422, detail=f"At most {ASK_BATCH_MAX_QUESTIONS} questions per batch")
+    _check_admission(BATCH_PRIORITY_CLASS)
+    questions = [(q.id if q.id is not None else str(i), q.query) for i, q in enumerate(payload.questions)]
+    max_parallel = min(payload.max_parallel or ASK_BATCH_CONCURRENCY, ASK_BATCH_CONCURRENCY)
+    results = _ndjson_results(answer_batch(questions, max_parallel))
+    return StreamingResponse(_stream_until_disconnect(results, request), media_type="application/x-ndjson")
+
+@router.get("/stats/generations")
+async def generation_counts():
+    return generation_stats.as_dict()
+
+def _save_upload(upload: UploadFile, path: str):
+    with open(path, "wb") as f:
+        shutil.copyfileobj(upload.file, f)
+
+@router.post("/ingest")
+async def submit_ingest(files: List[UploadFile] = File(default=[]), urls: List[str] = Form(default=[])):
+    """Queue uploaded PDFs and/or PDF URLs for indexing; returns the job id to poll"""
+    urls = [url.strip() for url in urls if url.strip()]
+    if not files and not urls:
+        raise HTTPException(status_code=422, detail="Provide at least one file or URL")
+
+    job_id = ingest_jobs.new_job_id()
+    job_dir = ingest_jobs.new_job_dir(job_id)
+    sources = []
+    for i, upload in enumerate(files):
+        name = os.path.basename(upload.filename or f"upload-{i}.pdf")
+        path = os.path.join(job_dir, f"{i}-{name}")
+        await asyncio.to_thread(_save_upload, upload, path)
+        sources.append({"name": name, "path": path})
+    sources += [{"name": url.split('/')[-1] or url, "url": url} for url in urls]
+
+    job = ingest_jobs.submit(job_id, sources)
+    return {"job_id": job.job_id, "status": job.status, "documents": len(sources)}
+
+@router.get("/ingest")
+async def list_ingest_jobs():
+    return ingest_jobs.list()
+
+@router.post("/ingest/reset")
+async def reset_index():
+    """Drop every indexed document"""
+    await asyncio.to_thread(ingest_jobs.reset_collection)
+    return {"status": "Index cleared"}
+
+def _get_job(job_id: str):
+    job = ingest_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown ingest job '{job_id}'")
+    return job
+
+@router.get("/ingest/{job_id}")
+async def ingest_status(job_id: str):
+    return _get_job(job_id).summary()
+
+@router.get("/ingest/{job_id}/events")
+async def ingest_events(job_id: str, request: Request):
+    """Stream a job's progress events as NDJSON, from the start, until the job ends"""
+    job = _get_job(job_id)
+
+    async def events():
+        sent = 0
+        while True:
+            while sent < len(job.events):
+                yield json.dumps(job.events[sent]) + "\n"
+                sent += 1
+            if job.done:
+                yield json.dumps({"job_id": job.job_id, "status": job.status, "chunks": job.chunks,
+                                  "error": job.error}) + "\n"
+                return
+            await asyncio.sleep(INGEST_EVENT_POLL_INTERVAL)
+
+    return StreamingResponse(_stream_until_disconnect(events(), request), media_type="application/x-ndjson")
+
+@router.delete("/ingest/{job_id}")
+async def cancel_ingest(job_id: str):
+    _get_job(job_id)
+    return {"cancelled": ingest_jobs.cancel(job_id)}
+
+@router.get("/stats/admission")
+async def admission_stats():
+    return admission.stats()
+
+@router.get("/stats/coalescing")
+async def coalescing_stats():
+    return inflight_generations.stats()
+
+@router.get("/stats/query_cache")
+async def query_cache_stats():
+    return query_embedding_cache.stats()
+
+@router.delete("/cache/query_embeddings")
+async def clear_query_cache():
+    query_embedding_cache.invalidate()
+    return {"status": "Query embedding cache cleared"}
+
+@router.get("/stats/answer_cache")
+async def answer_cache_stats():
+    return answer_cache.stats()
+
+@router.delete("/cache/answers")
+async def clear_answer_cache():
+    answer_cache.invalidate()
+    return {"status": "Answer cache cleared"}
+
+@router.get("/stats/sessions")
+async def session_stats():
+    return session_store.stats()
+
+@router.delete("/sessions/{session_id}")
+async def end_session(session_id: str):
+    return {"deleted": session_store.delete(session_id)}
 
 @router.post("/feedback")
 async def feedback(payload: FeedbackRequest):
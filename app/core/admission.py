@@ -0,0 +1,167 @@
+import os
+import heapq
+import asyncio
+import itertools
+from dataclasses import dataclass
+from app.core.metrics import ADMISSION_REJECTED
+
+# generations sent to Ollama at once; more than the model server can run in parallel
+# only makes every request slower
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+# requests allowed to wait for a slot before new ones are turned away
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', '32'))
+# request class -> priority, lower is served first
+PRIORITY_CLASSES = {
+    name.strip(): int(value)
+    for name, value in (
+        item.split("=") for item in os.getenv('LLM_PRIORITY_CLASSES', 'interactive=0,batch=10').split(",") if item
+    )
+}
+DEFAULT_PRIORITY_CLASS = "interactive"
+BATCH_PRIORITY_CLASS = "batch"
+
+
+class QueueFullError(Exception):
+    """Raised when a request can neither run nor wait for the LLM"""
+
+
+@dataclass
+class QueuePosition:
+    """Streamed to the client while a request waits; 1 means it is next"""
+    position: int
+
+
+class Ticket:
+    """A request's place in the admission queue, from reserve() or enqueue() to release()."""
+
+    def __init__(self, controller, priority_class, priority, seq):
+        self.controller = controller
+        self.priority_class = priority_class
+        self.priority = priority
+        self.seq = seq
+        self.queued = False
+        self.admitted = False
+        self.released = False
+        self._changed = asyncio.Event()
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def notify(self):
+        self._changed.set()
+
+    async def wait(self):
+        """Yield the queue position whenever it changes, returning once admitted"""
+        last = None
+        while True:
+            # clear before looking, so a notify() while the caller handles a position is not lost
+            self._changed.clear()
+            if self.admitted:
+                return
+            position = self.controller.position(self)
+            if position != last:
+                last = position
+                yield position
+                continue
+            await self._changed.wait()
+
+    def release(self):
+        self.controller.release(self)
+
+
+class AdmissionController:
+    """
+    Limits concurrent LLM generations. Requests beyond `max_concurrency` wait in a
+    priority queue of at most `max_queue` entries, ordered by priority class and then
+    arrival; when the queue is full new requests are rejected straight away.
+
+    A request can reserve its place when it arrives and join the queue once its prompt
+    is ready; reservations count against the queue, so a burst is turned away before
+    any of it pays for retrieval.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE, priorities=None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.priorities = priorities or PRIORITY_CLASSES
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.reserved = 0
+        self._waiting = []
+        self._seq = itertools.count()
+
+    def has_capacity(self) -> bool:
+        return self.active + len(self._waiting) + self.reserved < self.max_concurrency + self.max_queue
+
+    def reserve(self, priority_class: str = DEFAULT_PRIORITY_CLASS) -> Ticket:
+        """Hold a place for a request that will enqueue() later; raises QueueFullError when there is none"""
+        if priority_class not in self.priorities:
+            raise ValueError(f"Unknown priority class '{priority_class}'")
+        if not self.has_capacity():
+            self.reject(priority_class)
+            raise QueueFullError(f"LLM queue is full ({self.max_queue} waiting)")
+        self.reserved += 1
+        return Ticket(self, priority_class, self.priorities[priority_class], next(self._seq))
+
+    def enqueue(self, priority_class: str = DEFAULT_PRIORITY_CLASS, ticket: Ticket = None) -> Ticket:
+        """Wait for a generation slot, on a reserved `ticket` or on a new one"""
+        if ticket is None:
+            ticket = self.reserve(priority_class)
+        self.reserved -= 1
+        ticket.queued = True
+        if self.active < self.max_concurrency and not self._waiting:
+            self._admit(ticket)
+            return ticket
+        heapq.heappush(self._waiting, ticket)
+        # a higher priority arrival moves lower priority waiters back
+        for waiting in self._waiting:
+            if ticket < waiting:
+                waiting.notify()
+        return ticket
+
+    def reject(self, priority_class: str):
+        """Count a request turned away for lack of capacity"""
+        self.rejected += 1
+        ADMISSION_REJECTED.labels(priority_class=priority_class).inc()
+
+    def position(self, ticket: Ticket) -> int:
+        return sum(1 for other in self._waiting if other < ticket) + 1
+
+    def _admit(self, ticket):
+        ticket.admitted = True
+        self.active += 1
+        self.admitted += 1
+        ticket.notify()
+
+    def release(self, ticket: Ticket):
+        if ticket.released:
+            return
+        ticket.released = True
+        if ticket.admitted:
+            self.active -= 1
+        elif ticket.queued:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+        else:
+            self.reserved -= 1
+        while self._waiting and self.active < self.max_concurrency:
+            self._admit(heapq.heappop(self._waiting))
+        # everyone still waiting may have moved up
+        for waiting in self._waiting:
+            waiting.notify()
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "waiting": len(self._waiting),
+            "reserved": self.reserved,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "priorities": self.priorities,
+        }
+
+
+admission = AdmissionController()
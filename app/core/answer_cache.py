@@ -0,0 +1,121 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+from app.core.collection_version import get_collection_version
+
+ANSWER_CACHE_SIZE = int(os.getenv('ANSWER_CACHE_SIZE', '512'))
+ANSWER_CACHE_TTL = float(os.getenv('ANSWER_CACHE_TTL', '3600'))
+ANSWER_CACHE_THRESHOLD = float(os.getenv('ANSWER_CACHE_THRESHOLD', '0.95'))
+
+
+class SemanticAnswerCache:
+    """
+    LRU cache of completed answers keyed on the query embedding.
+
+    A stored answer is returned when a new query has cosine similarity of at least
+    `threshold` with the cached query and retrieved exactly the same chunk IDs.
+    Everything is dropped when the collection version changes.
+    """
+
+    def __init__(self, maxsize=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, threshold=ANSWER_CACHE_THRESHOLD):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries = OrderedDict()   # entry id -> entry dict
+        self._by_chunks = {}            # (collection, chunk ids) -> set of entry ids
+        self._versions = {}             # collection -> version the entries were built against
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _unit(vector):
+        vec = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    @staticmethod
+    def _chunk_key(collection_name, chunk_ids):
+        return (collection_name, tuple(sorted(str(i) for i in chunk_ids)))
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        group = self._by_chunks.get(entry["chunk_key"])
+        if group is not None:
+            group.discard(entry_id)
+            if not group:
+                del self._by_chunks[entry["chunk_key"]]
+
+    def _check_version(self, collection_name):
+        version = get_collection_version(collection_name)
+        if self._versions.get(collection_name) != version:
+            for entry_id in [i for i, e in self._entries.items() if e["chunk_key"][0] == collection_name]:
+                self._remove(entry_id)
+            self._versions[collection_name] = version
+
+    def lookup(self, vector, chunk_ids, collection_name):
+        if self.maxsize <= 0 or not chunk_ids:
+            return None
+        query = self._unit(vector)
+        now = time.monotonic()
+        with self._lock:
+            self._check_version(collection_name)
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self._by_chunks.get(self._chunk_key(collection_name, chunk_ids), ())):
+                entry = self._entries[entry_id]
+                if now - entry["created"] > self.ttl:
+                    self._remove(entry_id)
+                    continue
+                score = float(np.dot(query, entry["vector"]))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            return self._entries[best_id]["answer"]
+
+    def store(self, vector, chunk_ids, collection_name, answer):
+        if self.maxsize <= 0 or not chunk_ids or not answer:
+            return
+        with self._lock:
+            self._check_version(collection_name)
+            chunk_key = self._chunk_key(collection_name, chunk_ids)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = {
+                "vector": self._unit(vector),
+                "chunk_key": chunk_key,
+                "answer": answer,
+                "created": time.monotonic(),
+            }
+            self._by_chunks.setdefault(chunk_key, set()).add(entry_id)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_chunks.clear()
+            self._versions.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+answer_cache = SemanticAnswerCache()
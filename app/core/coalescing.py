@@ -0,0 +1,109 @@
+import os
+import asyncio
+from contextlib import aclosing
+from typing import Any, Callable, Hashable, List, Optional
+from app.core.metrics import COALESCED_REQUESTS
+
+COALESCE_REQUESTS = os.getenv('COALESCE_REQUESTS', 'true').lower() == 'true'
+
+
+class _Flight:
+    """One running producer and everything it has yielded so far."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self):
+        await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    Shares one async generator between concurrent callers asking for the same key.
+
+    The first caller starts the producer in a background task; everyone subscribed to
+    the key, including callers that join later, receives every item from the start.
+    The producer is cancelled once its last subscriber leaves, and the key is released
+    when it finishes, so only requests that overlap in time are coalesced. Items for
+    which `transient(item)` is true, such as queue positions, are skipped once a later
+    item has superseded them instead of being replayed.
+    """
+
+    def __init__(self, transient: Optional[Callable[[Any], bool]] = None):
+        self._flights = {}
+        self.transient = transient
+        self.started = 0
+        self.joined = 0
+
+    def in_flight(self, key: Hashable) -> bool:
+        """Whether subscribing to `key` now would join a running producer"""
+        return key in self._flights
+
+    async def subscribe(self, key: Hashable, producer: Callable[[], Any]):
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = _Flight()
+            self._flights[key] = flight
+            flight.task = asyncio.create_task(self._run(key, flight, producer()))
+            self.started += 1
+        else:
+            self.joined += 1
+            COALESCED_REQUESTS.inc()
+
+        flight.subscribers += 1
+        try:
+            position = 0
+            while True:
+                while position < len(flight.items):
+                    item = flight.items[position]
+                    position += 1
+                    if self.transient is not None and position < len(flight.items) and self.transient(item):
+                        continue
+                    yield item
+                if flight.done:
+                    break
+                await flight.wait()
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # nobody is listening any more; stop the upstream work and let the
+                # next request for this key start afresh
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    async def _run(self, key, flight: _Flight, producer):
+        try:
+            async with aclosing(producer):
+                async for item in producer:
+                    flight.items.append(item)
+                    flight.notify()
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.notify()
+
+    def stats(self):
+        return {
+            "in_flight": len(self._flights),
+            "subscribers": sum(flight.subscribers for flight in self._flights.values()),
+            "started": self.started,
+            "joined": self.joined,
+        }
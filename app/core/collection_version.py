@@ -0,0 +1,49 @@
+import os
+import uuid
+import threading
+
+VERSION_DIR = os.getenv('COLLECTION_VERSION_DIR', 'data/collection_versions')
+
+_lock = threading.Lock()
+# collection -> (file mtime_ns, version token)
+_seen = {}
+
+
+def _version_path(collection_name):
+    return os.path.join(VERSION_DIR, f"{collection_name}.version")
+
+
+def bump_collection_version(collection_name):
+    """Record that a collection's contents changed. Shared by the indexer and the API process."""
+    os.makedirs(VERSION_DIR, exist_ok=True)
+    path = _version_path(collection_name)
+    token = uuid.uuid4().hex
+    tmp_path = f"{path}.{token}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(token)
+    os.replace(tmp_path, path)
+    return token
+
+
+def get_collection_version(collection_name):
+    """Return the current version token, or "0" if the collection was never changed through the indexer."""
+    path = _version_path(collection_name)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return "0"
+
+    with _lock:
+        cached = _seen.get(collection_name)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            token = f.read().strip() or "0"
+    except FileNotFoundError:
+        return "0"
+
+    with _lock:
+        _seen[collection_name] = (mtime, token)
+    return token
@@ -0,0 +1,230 @@
+import os
+import re
+import math
+import threading
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+# Hugging Face id of the tokenizer matching the Ollama model; empty falls back to an estimate
+LLM_TOKENIZER = os.getenv('LLM_TOKENIZER', '')
+NUM_CTX = int(os.getenv('OLLAMA_NUM_CTX', '4096'))
+NUM_PREDICT = int(os.getenv('OLLAMA_NUM_PREDICT', '256'))
+CONTEXT_SCORE_CUTOFF = float(os.getenv('CONTEXT_SCORE_CUTOFF', '0.2'))
+HISTORY_BUDGET_FRACTION = float(os.getenv('HISTORY_BUDGET_FRACTION', '0.3'))
+DEDUP_JACCARD_THRESHOLD = 0.6
+# tokens held back for template/special tokens the count doesn't see
+SAFETY_MARGIN = 32
+CHARS_PER_TOKEN = 3.5
+
+SYSTEM_PROMPT = """You are a research paper assistant. Answer questions ONLY based on the provided context from the research paper.
+    Do not make up facts, assumptions, or information not explicitly stated in the paper. If the answer is not in the provided context, clearly say "This information is not available in the provided paper." Cite relevant parts of the paper when possible."""
+
+
+class TokenCounter:
+    """Counts tokens with the model's tokenizer when LLM_TOKENIZER is set, otherwise estimates."""
+
+    def __init__(self, tokenizer_name: str = LLM_TOKENIZER):
+        self.tokenizer_name = tokenizer_name
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    def _get_tokenizer(self):
+        if self._tokenizer is None and self.tokenizer_name:
+            with self._lock:
+                if self._tokenizer is None:
+                    from transformers import AutoTokenizer
+                    self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name)
+        return self._tokenizer
+
+    def count(self, text: str) -> int:
+        tokenizer = self._get_tokenizer()
+        if tokenizer is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(tokenizer.encode(text, add_special_tokens=False))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Keep the start of `text`, at most `max_tokens` tokens of it"""
+        if max_tokens <= 0:
+            return ""
+        tokenizer = self._get_tokenizer()
+        if tokenizer is None:
+            return text[:int(max_tokens * CHARS_PER_TOKEN)]
+        ids = tokenizer.encode(text, add_special_tokens=False)
+        return text if len(ids) <= max_tokens else tokenizer.decode(ids[:max_tokens])
+
+
+def _shingles(text: str, size: int = 5) -> set:
+    words = re.findall(r"\w+", text.lower())
+    return {" ".join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+@dataclass
+class BuiltPrompt:
+    prompt: str
+    chunk_ids: List[str]
+    stats: dict = field(default_factory=dict)
+
+
+class ContextBuilder:
+    """
+    Lays out system prompt, retrieved context and conversation within the model window.
+
+    The budget is num_ctx minus the generation allowance. History gets at most
+    `history_fraction` of what is left after the system prompt and question, keeping
+    the newest turns and folding dropped ones into a one-line summary. Context gets the
+    rest: chunks below `score_cutoff` and near-duplicates are dropped, the remainder is
+    added in rank order until the budget is used.
+    """
+
+    def __init__(self, counter: Optional[TokenCounter] = None, num_ctx: int = NUM_CTX,
+                 num_predict: int = NUM_PREDICT, score_cutoff: float = CONTEXT_SCORE_CUTOFF,
+                 history_fraction: float = HISTORY_BUDGET_FRACTION, system_prompt: str = SYSTEM_PROMPT):
+        self.counter = counter or TokenCounter()
+        self.num_ctx = num_ctx
+        self.num_predict = num_predict
+        self.score_cutoff = score_cutoff
+        self.history_fraction = history_fraction
+        self.system_prompt = system_prompt
+
+    def select_chunks(self, hits) -> list:
+        """Drop low-scoring and near-duplicate hits, keeping rank order"""
+        selected = []
+        seen = []
+        for hit in hits:
+            content = (hit.payload or {}).get('content', '')
+            if not content:
+                continue
+            if hit.score is not None and hit.score < self.score_cutoff:
+                continue
+            shingles = _shingles(content)
+            duplicate = False
+            for other in seen:
+                overlap = len(shingles & other)
+                # same text, or one chunk mostly contained in the other
+                if overlap / len(shingles | other) >= DEDUP_JACCARD_THRESHOLD or \
+                        overlap / min(len(shingles), len(other)) >= 0.9:
+                    duplicate = True
+                    break
+            if duplicate:
+                continue
+            seen.append(shingles)
+            selected.append(hit)
+        return selected
+
+    def fit_history(self, history: List[Tuple[str, str]], budget: int) -> Tuple[str, int, int]:
+        """
+        Render the newest turns that fit in `budget` tokens, summarizing older ones.
+        Returns (text, tokens used, number of turns dropped).
+        """
+        turns = [f"User: {q}\nAssistant: {a}\n" for q, a in history]
+        kept = []
+        used = 0
+        for turn in reversed(turns):
+            cost = self.counter.count(turn)
+            if used + cost > budget:
+                break
+            kept.append(turn)
+            used += cost
+        kept.reverse()
+
+        dropped = len(turns) - len(kept)
+        if dropped:
+            summary = "Earlier the user asked: " + "; ".join(q for q, _ in history[:dropped]) + "\n"
+            summary = self.counter.truncate(summary, budget - used)
+            if summary:
+                kept.insert(0, summary)
+                used += self.counter.count(summary)
+        return "".join(kept), used, dropped
+
+    def render_turn(self, context: str, query: str) -> str:
+        """The per-question part of the prompt: fresh context followed by the question"""
+        return (
+            f"### Context:\n{context}\n\n"
+            f"### Question:\nUser: {query}\nAssistant:\n\n"
+            f"### Assistant Response:"
+        )
+
+    def render(self, context: str, conversation: str, query: str) -> str:
+        # System prompt and conversation come first and the per-question context last,
+        # so consecutive prompts of one conversation share the longest possible prefix
+        # and the model server can reuse its KV cache for it.
+        return (
+            f"{self.system_prompt}\n\n"
+            f"### Conversation:\n{conversation}\n"
+            + self.render_turn(context, query)
+        )
+
+    def _fill_context(self, hits, context_budget: int):
+        context_parts = []
+        chunk_ids = []
+        context_tokens = 0
+        for hit in self.select_chunks(hits):
+            content = hit.payload['content']
+            # joined with a newline, as before
+            cost = self.counter.count(content + "\n")
+            if context_tokens + cost > context_budget:
+                left = context_budget - context_tokens
+                # a truncated chunk is still worth it if a useful amount fits
+                if left >= 64:
+                    context_parts.append(self.counter.truncate(content, left - 1))
+                    chunk_ids.append(hit.id)
+                    context_tokens = context_budget
+                break
+            context_parts.append(content)
+            chunk_ids.append(hit.id)
+            context_tokens += cost
+        return "\n".join(context_parts), chunk_ids, context_tokens
+
+    @property
+    def budget(self) -> int:
+        return self.num_ctx - self.num_predict - SAFETY_MARGIN
+
+    def build(self, query: str, hits, history: Optional[List[Tuple[str, str]]] = None) -> BuiltPrompt:
+        history = history or []
+        budget = self.budget
+        fixed = self.counter.count(self.render("", "", query))
+        remaining = max(0, budget - fixed)
+
+        conversation, history_tokens, dropped_turns = self.fit_history(history, int(remaining * self.history_fraction))
+        context, chunk_ids, context_tokens = self._fill_context(hits, remaining - history_tokens)
+
+        prompt = self.render(context, conversation, query)
+        return BuiltPrompt(
+            prompt=prompt,
+            chunk_ids=chunk_ids,
+            stats={
+                "budget": budget,
+                "fixed_tokens": fixed,
+                "history_tokens": history_tokens,
+                "context_tokens": context_tokens,
+                "chunks_used": len(chunk_ids),
+                "chunks_retrieved": len(hits),
+                "history_turns_dropped": dropped_turns,
+            }
+        )
+
+    def build_turn(self, query: str, hits, used_tokens: int) -> Optional[BuiltPrompt]:
+        """
+        Build only the next turn of a conversation whose first `used_tokens` tokens are
+        already held by the model server. Returns None when too little room is left
+        and the conversation has to be re-laid out with build().
+        """
+        fixed = self.counter.count(self.render_turn("", query))
+        available = self.budget - used_tokens - fixed
+        # insist on room for a reasonable amount of context
+        if available < self.budget * (1 - self.history_fraction) / 2:
+            return None
+
+        context, chunk_ids, context_tokens = self._fill_context(hits, available)
+        return BuiltPrompt(
+            prompt=self.render_turn(context, query),
+            chunk_ids=chunk_ids,
+            stats={
+                "budget": self.budget,
+                "reused_tokens": used_tokens,
+                "fixed_tokens": fixed,
+                "context_tokens": context_tokens,
+                "chunks_used": len(chunk_ids),
+                "chunks_retrieved": len(hits),
+            }
+        )
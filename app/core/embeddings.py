@@ -0,0 +1,180 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List
+import numpy as np
+
+EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'torch')
+ONNX_CACHE_DIR = os.getenv('ONNX_CACHE_DIR', 'models/onnx')
+ONNX_THREADS = int(os.getenv('ONNX_THREADS', '0'))  # 0 lets onnxruntime decide
+MAX_SEQ_LENGTH = 256
+
+
+class EmbeddingBackend(ABC):
+    """Common interface for the models that turn text into normalized embeddings."""
+
+    name = "base"
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.dimension = None
+
+    @property
+    def cache_key(self) -> str:
+        """Identifies the vectors this backend produces, for caches keyed on the model"""
+        return f"{self.name}:{self.model_name}"
+
+    @abstractmethod
+    def encode(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Return a (len(texts), dimension) float32 array of unit-length embeddings"""
+
+    def encode_one(self, text: str) -> np.ndarray:
+        return self.encode([text])[0]
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Full-precision PyTorch model through sentence-transformers."""
+
+    name = "torch"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
+        super().__init__(model_name)
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=64):
+        vectors = self.model.encode(
+            list(texts),
+            batch_size=batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class OnnxInt8Backend(EmbeddingBackend):
+    """
+    Dynamic int8-quantized ONNX export of the same model, run with ONNX Runtime on CPU.
+    The model is exported and quantized once into `cache_dir` and reused afterwards.
+    """
+
+    name = "onnx-int8"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL, cache_dir: str = ONNX_CACHE_DIR):
+        super().__init__(model_name)
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("EMBEDDING_BACKEND=onnx-int8 requires the onnxruntime package") from e
+        from transformers import AutoTokenizer
+
+        model_dir = Path(cache_dir) / model_name.replace('/', '__')
+        quantized_path = model_dir / "model.int8.onnx"
+        if not quantized_path.exists():
+            self._export_quantized(model_name, model_dir, quantized_path)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        options = ort.SessionOptions()
+        if ONNX_THREADS:
+            options.intra_op_num_threads = ONNX_THREADS
+        self.session = ort.InferenceSession(
+            str(quantized_path), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+
+    @staticmethod
+    def _export_quantized(model_name, model_dir, quantized_path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        model_dir.mkdir(parents=True, exist_ok=True)
+        fp32_path = model_dir / "model.onnx"
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        sample = tokenizer(["warmup"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in input_names),
+                str(fp32_path),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+        quantize_dynamic(str(fp32_path), str(quantized_path), weight_type=QuantType.QInt8)
+        fp32_path.unlink()
+
+    def encode(self, texts, batch_size=64):
+        texts = list(texts)
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            batch = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=MAX_SEQ_LENGTH,
+                return_tensors="np"
+            )
+            feeds = {name: batch[name].astype(np.int64) for name in self.input_names if name in batch}
+            hidden = self.session.run(None, feeds)[0]
+
+            # mean pooling over real tokens, then L2 normalize, as sentence-transformers does
+            mask = batch["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+            outputs.append(pooled / np.clip(norms, 1e-12, None))
+
+        if not outputs:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        return np.vstack(outputs).astype(np.float32)
+
+
+BACKENDS = {
+    SentenceTransformerBackend.name: SentenceTransformerBackend,
+    OnnxInt8Backend.name: OnnxInt8Backend,
+}
+
+_instances = {}
+_lock = threading.Lock()
+
+
+def get_embedding_backend(name: str = None, model_name: str = EMBEDDING_MODEL) -> EmbeddingBackend:
+    """Return the shared backend instance for `name` (defaults to EMBEDDING_BACKEND)"""
+    name = name or EMBEDDING_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend '{name}', expected one of {sorted(BACKENDS)}")
+    key = (name, model_name)
+    with _lock:
+        if key not in _instances:
+            _instances[key] = BACKENDS[name](model_name)
+        return _instances[key]
+
+
+def check_backend_agreement(reference: EmbeddingBackend, candidate: EmbeddingBackend,
+                            texts: List[str]) -> dict:
+    """
+    Compare two backends on the same texts. Both return unit vectors, so the row-wise dot
+    product is the cosine similarity between the two embeddings of each text.
+    """
+    ref = reference.encode(texts)
+    cand = candidate.encode(texts)
+    cosines = np.sum(ref * cand, axis=1)
+    return {
+        "reference": reference.cache_key,
+        "candidate": candidate.cache_key,
+        "count": len(texts),
+        "mean_cosine": float(cosines.mean()) if len(texts) else 0.0,
+        "min_cosine": float(cosines.min()) if len(texts) else 0.0,
+    }
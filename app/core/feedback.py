@@ -1,8 +1,109 @@
 import os
 import json
+import queue
+import logging
+import threading
 from datetime import datetime
 
-FEEDBACK_LOG = 'data/feedback_log.json'
+_log = logging.getLogger(__name__)
+
+FEEDBACK_LOG = 'data/feedback_log.jsonl'
+LEGACY_FEEDBACK_LOG = 'data/feedback_log.json'
+FEEDBACK_BATCH_SIZE = 256
+FEEDBACK_FLUSH_INTERVAL = 0.5
+
+
+def migrate_legacy_log(legacy_path=LEGACY_FEEDBACK_LOG, log_path=FEEDBACK_LOG):
+    """One-time conversion of the old JSON array log into the append-only JSONL log"""
+    if not os.path.exists(legacy_path) or os.path.exists(log_path):
+        return 0
+
+    with open(legacy_path, 'r', encoding='utf-8') as f:
+        try:
+            entries = json.load(f)
+        except json.JSONDecodeError:
+            entries = []
+
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    tmp_path = f"{log_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, log_path)
+    os.replace(legacy_path, f"{legacy_path}.migrated")
+
+    _log.info(f"Migrated {len(entries)} feedback entries to {log_path}")
+    return len(entries)
+
+
+class FeedbackWriter:
+    """
+    Background thread that appends queued feedback entries to a JSONL log.
+    Entries are written in batches and fsynced once per batch.
+    """
+
+    def __init__(self, log_path=FEEDBACK_LOG, batch_size=FEEDBACK_BATCH_SIZE,
+                 flush_interval=FEEDBACK_FLUSH_INTERVAL):
+        self.log_path = log_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = object()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        """Flush everything queued so far and stop the writer thread"""
+        with self._lock:
+            if self._thread is None:
+                return
+            self._queue.put(self._stop)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, entry):
+        self.start()
+        self._queue.put(entry)
+
+    def _run(self):
+        os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            stopping = False
+            while not stopping:
+                batch = [self._queue.get()]
+                # gather whatever else arrives within the flush interval, up to batch_size
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.append(self._queue.get(timeout=self.flush_interval))
+                    except queue.Empty:
+                        break
+
+                if self._stop in batch:
+                    stopping = True
+                    batch = [e for e in batch if e is not self._stop]
+                    # anything queued behind the stop marker still gets written
+                    while not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                if not batch:
+                    continue
+
+                try:
+                    f.write("".join(json.dumps(entry) + "\n" for entry in batch))
+                    f.flush()
+                    os.fsync(f.fileno())
+                except Exception:
+                    _log.exception(f"Failed to write {len(batch)} feedback entries")
+
+
+feedback_writer = FeedbackWriter()
 
 
 def store_feedback(payload):
@@ -13,20 +114,5 @@ def store_feedback(payload):
         "user_feedback": payload.get("user_feedback")
     }
 
-    os.makedirs(os.path.dirname(FEEDBACK_LOG), exist_ok=True)
-
-    # Append feedback to the log file
-    if os.path.exists(FEEDBACK_LOG):
-        with open(FEEDBACK_LOG, 'r+', encoding='utf-8') as f:
-            try:
-                data = json.load(f)
-            except json.JSONDecodeError:
-                data = []
-            data.append(feedback_entry)
-            f.seek(0)
-            json.dump(data, f, indent=2)
-    else:
-        with open(FEEDBACK_LOG, 'w', encoding='utf-8') as f:
-            json.dump([feedback_entry], f, indent=2)
-
-    print(f"Feedback stored at {feedback_entry['timestamp']}")
+    # queued for the background writer, so the request never waits on disk I/O
+    feedback_writer.submit(feedback_entry)
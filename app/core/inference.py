@@ -1,66 +1,359 @@
 import os
-import traceback
-from dotenv import load_dotenv
-from huggingface_hub import InferenceClient
-from app.core.retriever import retrieve_relevant_chunks
-import requests
 import json
+import time
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Optional
+import httpx
+from app.core.retriever import COLLECTION_NAME, normalize_query
+from app.core.collection_version import get_collection_version
+from app.core.coalescing import SingleFlight, COALESCE_REQUESTS
+from app.core.admission import (
+    admission, QueueFullError, QueuePosition, Ticket, DEFAULT_PRIORITY_CLASS, BATCH_PRIORITY_CLASS
+)
+from app.core.registry import registry
+from app.core.answer_cache import answer_cache
+from app.core.context import ContextBuilder, NUM_CTX, NUM_PREDICT
+from app.core.sessions import session_store
+from app.core.metrics import (
+    RequestTimer, GENERATIONS, TIME_TO_FIRST_TOKEN, REQUEST_SECONDS, TOKENS_PER_SECOND, stage
+)
 
+_log = logging.getLogger(__name__)
 
-def generate_answer_stream(query: str, history: list = None):
+OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434')
+OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'my-llama3-gguf')
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv('OLLAMA_CONNECT_TIMEOUT', '5'))
+OLLAMA_READ_TIMEOUT = float(os.getenv('OLLAMA_READ_TIMEOUT', '120'))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv('OLLAMA_MAX_CONNECTIONS', '100'))
+OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+# generations a single /ask_batch request runs at once
+ASK_BATCH_CONCURRENCY = int(os.getenv('ASK_BATCH_CONCURRENCY', '4'))
 
-    if history is None:
-        history = []
+context_builder = ContextBuilder()
 
-    context = retrieve_relevant_chunks(query)
-    print(f"[DEBUG] Retrieved context: {context[:200]}...\n")
+# yielded once by generate_answer_stream(timer=...) when retrieval and prompt
+# building are done, so callers can send the Server-Timing header before any tokens
+PROMPT_READY = object()
 
-    if not context:
-        yield "Sorry, I couldn't find relevant information."
+
+@dataclass
+class GenerationError:
+    """
+    Yielded in place of (further) tokens when a generation fails or is turned away:
+    /ask shows `message` as the answer, /ask_batch reports it as the question's error.
+    """
+    message: str
+
+
+# identical questions asked while one is being answered share its generation; a late
+# joiner is not shown the queue positions the generation has already moved past
+inflight_generations = SingleFlight(transient=lambda item: isinstance(item, QueuePosition))
+
+# one pooled client shared by every request, created on first use
+_ollama_client: Optional[httpx.AsyncClient] = None
+
+
+def get_ollama_client() -> httpx.AsyncClient:
+    global _ollama_client
+    if _ollama_client is None or _ollama_client.is_closed:
+        _ollama_client = httpx.AsyncClient(
+            base_url=OLLAMA_URL,
+            timeout=httpx.Timeout(
+                connect=OLLAMA_CONNECT_TIMEOUT,
+                read=OLLAMA_READ_TIMEOUT,
+                write=OLLAMA_CONNECT_TIMEOUT,
+                pool=OLLAMA_CONNECT_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=OLLAMA_MAX_CONNECTIONS,
+            ),
+        )
+    return _ollama_client
+
+
+class GenerationStats:
+    """Counts how upstream generations ended."""
+
+    def __init__(self):
+        self.completed = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def record(self, outcome):
+        setattr(self, outcome, getattr(self, outcome) + 1)
+        GENERATIONS.labels(outcome=outcome).inc()
+
+    def as_dict(self):
+        return {
+            "completed": self.completed,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+generation_stats = GenerationStats()
+
+
+async def close_ollama_client():
+    global _ollama_client
+    if _ollama_client is not None:
+        await _ollama_client.aclose()
+        _ollama_client = None
+
+
+async def preload_model():
+    """Ask Ollama to load the model into memory and keep it there"""
+    client = get_ollama_client()
+    response = await client.post(
+        "/api/generate",
+        json={"model": OLLAMA_MODEL, "keep_alive": OLLAMA_KEEP_ALIVE},
+        timeout=OLLAMA_READ_TIMEOUT
+    )
+    response.raise_for_status()
+
+
+async def generate_answer_stream(query: str, history: list = None, session_id: str = None, timer=None,
+                                 priority_class: str = DEFAULT_PRIORITY_CLASS, ticket: Ticket = None):
+    """
+    Stream an answer token by token. With a `session_id` the conversation is kept
+    server-side and `history` is ignored; turns of one session are answered one at a time.
+    With a `timer`, stage timings are recorded on it and PROMPT_READY is yielded first.
+    While waiting for a generation slot, QueuePosition items are yielded between tokens;
+    a failed generation ends with a GenerationError. A `ticket` reserved with
+    admission.reserve() is used for the generation and always released.
+    """
+    if COALESCE_REQUESTS and not session_id:
+        async for token in _coalesced(query, history or [], timer, priority_class, ticket):
+            yield token
         return
-    conversation = ""
-    for q, a in history:
-        conversation += f"User: {q}\nAssistant: {a}\n"
-    conversation+=f"User: {query}\nAssistant:"
-    system_prompt = """You are a research paper assistant. Answer questions ONLY based on the provided context from the research paper. 
-    Do not make up facts, assumptions, or information not explicitly stated in the paper. If the answer is not in the provided context, clearly say "This information is not available in the provided paper." Cite relevant parts of the paper when possible."""
-    prompt = (
-        f"{system_prompt}\n\n"
-        f"### Context:\n{context}\n\n"
-        f"### Conversation:\n{conversation}\n\n"
-        f"### Assistant Response:"
+    try:
+        if session_id:
+            session = session_store.get_or_create(session_id)
+            async with session.lock:
+                async for token in _generate(query, session.turns, session, timer, priority_class=priority_class,
+                                             ticket=ticket):
+                    yield token
+        else:
+            async for token in _generate(query, history or [], None, timer, priority_class=priority_class,
+                                         ticket=ticket):
+                yield token
+    finally:
+        # _generate() releases the ticket itself, unless it was never reached
+        if ticket is not None:
+            ticket.release()
+
+
+async def _coalesced(query: str, history: list, timer=None, priority_class: str = DEFAULT_PRIORITY_CLASS,
+                     ticket: Ticket = None):
+    """
+    _generate() shared with concurrent requests for the same question. Sessions are never
+    coalesced since each carries its own model context. The `ticket` goes to the
+    generation if this request starts it, and is given back straight away if it joins one.
+    """
+    key = (
+        normalize_query(query),
+        tuple(tuple(turn) for turn in history),
+        get_collection_version(COLLECTION_NAME),
     )
-    print(f"[DEBUG] Prompt for model:\n{prompt}\n")
-    payload = {
-                "model": "my-llama3-gguf",
-                "prompt": prompt,
-                "stream": True,
-                "temperature":0.2,
-                "num_ctx":4096,
-                "num_predict":256
-            }
+    # the first request's timer records the shared stages; it always exists so that
+    # every subscriber sees PROMPT_READY whether or not it started the generation
+    shared_timer = timer if timer is not None else RequestTimer()
+    waited = time.perf_counter()
+    started = []
+    if ticket is not None and inflight_generations.in_flight(key):
+        # the shared generation already has its own place in the queue
+        ticket.release()
+
+    def producer():
+        started.append(True)
+        return _generate(query, history, None, shared_timer, priority_class=priority_class, ticket=ticket)
+
+    def elapsed():
+        return timer.elapsed() if timer is not None else time.perf_counter() - waited
+
+    # _generate() observes the latency metrics of the request that started it; the
+    # ones that joined observe their own
+    first_token = True
+    failed = False
+    async for item in inflight_generations.subscribe(key, producer):
+        if item is PROMPT_READY:
+            if timer is None:
+                continue
+            if not started:
+                # the shared stages were timed on the timer of the request that started them
+                timer.record("coalesced_wait", time.perf_counter() - waited)
+        elif not started:
+            if isinstance(item, GenerationError):
+                failed = True
+            elif isinstance(item, str) and first_token:
+                first_token = False
+                TIME_TO_FIRST_TOKEN.observe(elapsed())
+        yield item
+    if not started and not first_token and not failed:
+        REQUEST_SECONDS.observe(elapsed())
+
+
+def _build_prompt(query, hits, history, session):
+    # a session that Ollama still holds only needs the new turn appended to its token context
+    if session is not None and session.ollama_context:
+        built = context_builder.build_turn(query, hits, len(session.ollama_context))
+        if built is not None:
+            return built
+        session.reset_context()
+    return context_builder.build(query, hits, history)
+
+
+async def answer_batch(questions, max_parallel: int = ASK_BATCH_CONCURRENCY):
+    """
+    Answer a list of (question id, query) pairs without history. Retrieval for the whole
+    batch is one encode and one vector search; generations then run at most
+    `max_parallel` at a time. Yields one result dict per question, in completion order.
+    """
+    retriever = await asyncio.to_thread(registry.get_retriever)
+    retrieved = await asyncio.to_thread(retriever.search_batch, [query for _, query in questions])
+    semaphore = asyncio.Semaphore(max(1, max_parallel))
+
+    async def answer_one(question_id, query, query_retrieved):
+        async with semaphore:
+            started = time.perf_counter()
+            parts = []
+            try:
+                async for token in _generate(query, [], None, retrieved=query_retrieved,
+                                             priority_class=BATCH_PRIORITY_CLASS):
+                    if isinstance(token, GenerationError):
+                        return {"id": question_id, "error": token.message}
+                    if isinstance(token, str):
+                        parts.append(token)
+            except Exception as e:
+                return {"id": question_id, "error": f"{type(e).__name__} - {str(e)}"}
+            return {"id": question_id, "answer": "".join(parts), "seconds": round(time.perf_counter() - started, 3)}
+
+    tasks = [
+        asyncio.create_task(answer_one(question_id, query, query_retrieved))
+        for (question_id, query), query_retrieved in zip(questions, retrieved)
+    ]
     try:
-        
-        with requests.post(
-            "http://localhost:11434/api/generate",
-            json=payload,
-            stream=True,          
-        ) as r:
-            r.raise_for_status()
-
-            for line in r.iter_lines():
-                if line:
-                    data = json.loads(line.decode("utf-8"))
-                    if data.get("done"):
-                        break
-                    token = data.get("response")
-                    if token:
-                        yield token
-
-    except Exception as e:
-        print("[ERROR] Exception during generation:")
-        traceback.print_exc()
-        yield f"Error: {type(e).__name__} - {str(e)}"
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # the caller went away: stop the generations that are still queued or running
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _generate(query: str, history: list, session, timer=None, retrieved=None,
+                    priority_class: str = DEFAULT_PRIORITY_CLASS, ticket: Ticket = None):
+    # a reserved ticket is released however the generation ends, including the early returns
+    try:
+        if retrieved is None:
+            # retrieval is CPU/blocking work, keep it off the event loop
+            retriever = await asyncio.to_thread(registry.get_retriever)
+            query_vec, hits = await asyncio.to_thread(retriever.search, query, timer)
+        else:
+            query_vec, hits = retrieved
+
+        # fit context and history into the model window
+        with stage(timer, "prompt_build"):
+            built = await asyncio.to_thread(_build_prompt, query, hits, history, session)
+        chunk_ids = built.chunk_ids
+        _log.debug("Prompt budget: %s", built.stats)
+        if timer is not None:
+            yield PROMPT_READY
+
+        if not chunk_ids:
+            yield "Sorry, I couldn't find relevant information."
+            return
+
+        # answers only depend on the query and chunks when there is no prior conversation
+        cacheable = not history
+        if cacheable:
+            cached = answer_cache.lookup(query_vec, chunk_ids, COLLECTION_NAME)
+            if cached is not None:
+                if session is not None:
+                    # the model never saw this turn, so the next one starts a fresh context
+                    session.turns.append((query, cached))
+                    session.reset_context()
+                if timer is not None:
+                    TIME_TO_FIRST_TOKEN.observe(timer.elapsed())
+                    REQUEST_SECONDS.observe(timer.elapsed())
+                yield cached
+                return
+        prompt = built.prompt
+        _log.debug("Prompt for model:\n%s", prompt)
+        payload = {
+                    "model": OLLAMA_MODEL,
+                    "prompt": prompt,
+                    "stream": True,
+                    "keep_alive": OLLAMA_KEEP_ALIVE,
+                    # sampling and window settings are only honoured under "options"
+                    "options": {
+                        "temperature":0.2,
+                        "num_ctx":NUM_CTX,
+                        "num_predict":NUM_PREDICT
+                    }
+                }
+        if session is not None and session.ollama_context:
+            payload["context"] = session.ollama_context
+        try:
+            # wait for a generation slot so an overloaded model server isn't made slower for everyone
+            ticket = admission.enqueue(priority_class, ticket)
+            queued = time.perf_counter()
+            async for position in ticket.wait():
+                yield QueuePosition(position)
+            if timer is not None:
+                timer.record("queue_wait", time.perf_counter() - queued)
 
+            client = get_ollama_client()
+            # leaving this block closes the connection, which makes Ollama abort the generation
+            async with client.stream("POST", "/api/generate", json=payload) as r:
+                r.raise_for_status()
 
+                answer_parts = []
+                final_context = None
+                async for line in r.aiter_lines():
+                    if line:
+                        data = json.loads(line)
+                        if data.get("done"):
+                            final_context = data.get("context")
+                            if data.get("eval_count") and data.get("eval_duration"):
+                                TOKENS_PER_SECOND.observe(data["eval_count"] / (data["eval_duration"] / 1e9))
+                            break
+                        token = data.get("response")
+                        if token:
+                            if not answer_parts and timer is not None:
+                                TIME_TO_FIRST_TOKEN.observe(timer.elapsed())
+                                generation_started = time.perf_counter()
+                            answer_parts.append(token)
+                            yield token
+            generation_stats.record("completed")
+            if timer is not None:
+                if answer_parts:
+                    timer.record("generation", time.perf_counter() - generation_started)
+                REQUEST_SECONDS.observe(timer.elapsed())
+            answer = "".join(answer_parts)
+            if cacheable:
+                answer_cache.store(query_vec, chunk_ids, COLLECTION_NAME, answer)
+            if session is not None:
+                session.turns.append((query, answer))
+                session.ollama_context = final_context
 
+        except QueueFullError:
+            generation_stats.record("rejected")
+            yield GenerationError("Sorry, the server is busy right now. Please try again in a moment.")
+        except (GeneratorExit, asyncio.CancelledError):
+            generation_stats.record("cancelled")
+            _log.info("Generation cancelled by client disconnect")
+            raise
+        except Exception as e:
+            generation_stats.record("failed")
+            _log.exception("Exception during generation")
+            yield GenerationError(f"Error: {type(e).__name__} - {str(e)}")
+    finally:
+        if ticket is not None:
+            ticket.release()
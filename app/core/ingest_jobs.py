@@ -0,0 +1,211 @@
+import os
+import time
+import uuid
+import queue
+import shutil
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import closing
+from dataclasses import dataclass, field, asdict
+from typing import List, Optional
+from app.core.retriever import COLLECTION_NAME
+from app.core.registry import registry
+
+_log = logging.getLogger(__name__)
+
+INGEST_UPLOAD_DIR = os.getenv('INGEST_UPLOAD_DIR', 'data/ingest_uploads')
+# jobs run one after another; each job already runs its documents concurrently
+INGEST_JOB_WORKERS = int(os.getenv('INGEST_JOB_WORKERS', '1'))
+INGEST_JOB_HISTORY = int(os.getenv('INGEST_JOB_HISTORY', '100'))
+
+FINAL_STATES = ("completed", "failed", "cancelled")
+
+
+@dataclass
+class IngestJob:
+    job_id: str
+    sources: List[dict]                          # {"name", "path" or "url"}
+    status: str = "queued"                       # queued | running | completed | failed | cancelled
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    documents: List[dict] = field(default_factory=list)  # progress per source, in order
+    events: List[dict] = field(default_factory=list)
+    chunks: int = 0
+    error: Optional[str] = None
+    cancel_requested: bool = False
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINAL_STATES
+
+    def summary(self) -> dict:
+        finished = sum(1 for doc in self.documents if doc.get("finished"))
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "total_documents": len(self.sources),
+            "finished_documents": finished,
+            "chunks": self.chunks,
+            "documents": self.documents,
+            "error": self.error,
+        }
+
+
+class IngestJobManager:
+    """
+    Runs ingestion jobs on background worker threads. The document converter,
+    embedder, vector store and sparse index are created once and shared by every job
+    (the last three with the retriever), so their load cost is paid once per server
+    rather than once per submission.
+    """
+
+    def __init__(self, workers=INGEST_JOB_WORKERS, upload_dir=INGEST_UPLOAD_DIR, history=INGEST_JOB_HISTORY):
+        self.workers = max(1, workers)
+        self.upload_dir = upload_dir
+        self.history = history
+        self._jobs = OrderedDict()
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._resources_lock = threading.Lock()
+        self._processor = None
+        self._indexer = None
+
+    # -- resources ---------------------------------------------------------
+
+    def get_resources(self):
+        """(DocumentProcessor, QdrantIndexer), built on first use"""
+        if self._indexer is None:
+            with self._resources_lock:
+                if self._indexer is None:
+                    # Docling is heavy to import; only pay for it once ingestion is used
+                    from scripts.ingest3 import DocumentProcessor, QdrantIndexer
+
+                    retriever = registry.get_retriever()
+                    self._processor = DocumentProcessor()
+                    self._indexer = QdrantIndexer(
+                        collection_name=COLLECTION_NAME, embedder=retriever.embedder, store=retriever.store,
+                        sparse_index=retriever.sparse_index
+                    )
+        return self._processor, self._indexer
+
+    def reset_collection(self):
+        _, indexer = self.get_resources()
+        indexer.clear_collection()
+
+    # -- jobs --------------------------------------------------------------
+
+    def start(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"ingest-job-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout=10)
+        self._threads = []
+        with self._resources_lock:
+            if self._processor is not None:
+                self._processor.close()
+
+    def new_job_dir(self, job_id: str) -> str:
+        path = os.path.join(self.upload_dir, job_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def new_job_id(self) -> str:
+        return uuid.uuid4().hex
+
+    def submit(self, job_id: str, sources: List[dict]) -> IngestJob:
+        job = IngestJob(job_id=job_id, sources=sources)
+        # by position, since two uploads may share a file name
+        job.documents = [
+            {"name": source["name"], "stage": None, "status": "queued", "finished": False} for source in sources
+        ]
+        with self._lock:
+            self._jobs[job_id] = job
+            self._evict()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[dict]:
+        with self._lock:
+            return [
+                {"job_id": job.job_id, "status": job.status, "created": job.created, "chunks": job.chunks}
+                for job in self._jobs.values()
+            ]
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        if job is None or job.done:
+            return False
+        job.cancel_requested = True
+        return True
+
+    def _evict(self):
+        # forget the oldest finished jobs beyond the history limit
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(self._jobs) - self.history)]:
+            del self._jobs[job_id]
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            if job.cancel_requested:
+                job.status = "cancelled"
+                job.finished = time.time()
+                self._remove_uploads(job)
+                continue
+            try:
+                self._run_job(job)
+            except Exception as e:
+                _log.exception(f"Ingest job {job.job_id} failed")
+                job.error = f"{type(e).__name__}: {e}"
+                job.status = "failed"
+            finally:
+                job.finished = time.time()
+                self._remove_uploads(job)
+
+    def _run_job(self, job: IngestJob):
+        from scripts.ingest_pipeline import IngestPipeline, IngestSource
+
+        job.status = "running"
+        job.started = time.time()
+        processor, indexer = self.get_resources()
+        sources = [IngestSource(name=s["name"], path=s.get("path"), url=s.get("url")) for s in job.sources]
+
+        with closing(IngestPipeline(processor, indexer).run(sources)) as events:
+            for event in events:
+                document = job.documents[event.index]
+                document.update(stage=event.stage, status=event.status, detail=event.detail,
+                                finished=event.finished)
+                if event.finished:
+                    document["chunks"] = event.chunks
+                    job.chunks += event.chunks
+                job.events.append(asdict(event))
+                if job.cancel_requested:
+                    job.status = "cancelled"
+                    return
+        job.status = "completed"
+
+    def _remove_uploads(self, job: IngestJob):
+        shutil.rmtree(os.path.join(self.upload_dir, job.job_id), ignore_errors=True)
+
+
+ingest_jobs = IngestJobManager()
@@ -0,0 +1,81 @@
+import time
+from contextlib import contextmanager, nullcontext
+from prometheus_client import Counter, Histogram
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_seconds", "Time spent in each stage of answering a question",
+    ["stage"], buckets=LATENCY_BUCKETS
+)
+TIME_TO_FIRST_TOKEN = Histogram(
+    "rag_time_to_first_token_seconds", "Time from request start to the first streamed token",
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "rag_request_seconds", "Total time to stream a complete answer",
+    buckets=LATENCY_BUCKETS
+)
+TOKENS_PER_SECOND = Histogram(
+    "rag_generation_tokens_per_second", "LLM decode speed as reported by Ollama",
+    buckets=(1, 2, 5, 10, 15, 20, 30, 40, 60, 80, 120)
+)
+GENERATIONS = Counter(
+    "rag_generations_total", "Upstream generations by how they ended", ["outcome"]
+)
+COALESCED_REQUESTS = Counter(
+    "rag_coalesced_requests_total", "Requests served by joining an identical generation already in flight"
+)
+ADMISSION_REJECTED = Counter(
+    "rag_admission_rejected_total", "Requests turned away because the LLM queue was full", ["priority_class"]
+)
+
+INGEST_DOCUMENTS = Counter(
+    "ingest_documents_total", "Documents passed to the indexer", ["result"]
+)
+INGEST_CHUNKS = Counter(
+    "ingest_chunks_total", "Chunks written to or removed from the vector store", ["operation"]
+)
+CONVERSION_CACHE_LOOKUPS = Counter(
+    "ingest_conversion_cache_lookups_total", "Docling conversion cache lookups", ["result"]
+)
+INGEST_PAGES = Counter(
+    "ingest_pages_total", "PDF pages converted, by extraction path", ["path"]
+)
+INGEST_STAGE_SECONDS = Histogram(
+    "ingest_stage_seconds", "Time spent in each indexing stage", ["stage"], buckets=LATENCY_BUCKETS
+)
+
+
+class RequestTimer:
+    """
+    Collects per-stage durations for one request. Each stage is also observed in
+    STAGE_SECONDS; server_timing() renders the stages seen so far as a Server-Timing header.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        STAGE_SECONDS.labels(stage=name).observe(seconds)
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def server_timing(self):
+        return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items())
+
+
+def stage(timer, name):
+    """timer.stage(name), or a no-op when there is no timer"""
+    return timer.stage(name) if timer is not None else nullcontext()
@@ -0,0 +1,66 @@
+import os
+import asyncio
+import logging
+import threading
+from app.core.retriever import Retriever
+
+_log = logging.getLogger(__name__)
+
+WARMUP_ON_STARTUP = os.getenv('WARMUP_ON_STARTUP', 'true').lower() == 'true'
+
+
+class ResourceRegistry:
+    """
+    Owns the heavy, process-wide resources (embedding model, vector store client).
+    Nothing is loaded on import; resources are created on first use or by warmup().
+    """
+
+    def __init__(self):
+        self._retriever = None
+        self._lock = threading.Lock()
+        self.warm = False
+        self.warming = False
+        self.warmup_error = None
+
+    def get_retriever(self) -> Retriever:
+        if self._retriever is None:
+            with self._lock:
+                if self._retriever is None:
+                    self._retriever = Retriever()
+        return self._retriever
+
+    async def warmup(self):
+        """Load the embedder, run a dummy encode and preload the Ollama model"""
+        from app.core.inference import preload_model
+
+        self.warming = True
+        self.warmup_error = None
+        try:
+            retriever = await asyncio.to_thread(self.get_retriever)
+            await asyncio.to_thread(retriever.warmup)
+            await preload_model()
+            self.warm = True
+            _log.info("Models warm")
+        except Exception as e:
+            self.warmup_error = f"{type(e).__name__}: {e}"
+            _log.exception("Warmup failed")
+        finally:
+            self.warming = False
+
+    def status(self):
+        return {
+            "ready": self.warm,
+            "warming": self.warming,
+            "retriever_loaded": self._retriever is not None,
+            "error": self.warmup_error,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._retriever is not None:
+                self._retriever.store.close()
+                self._retriever = None
+            self.warm = False
+
+
+registry = ResourceRegistry()
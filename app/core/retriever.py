@@ -1,47 +1,178 @@
-
-import json
-import numpy as np
-from sentence_transformers import SentenceTransformer
-from qdrant_client import QdrantClient
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import os
-# INDEX_PATH = 'data/faiss_index.index'
-# DOCSTORE_PATH = 'data/docstore.json'
-EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
-QDRANT_HOST = os.getenv('QDRANT_HOST', 'localhost')
-QDRANT_PORT = int(os.getenv('QDRANT_PORT', '6333'))
+from app.core.embeddings import get_embedding_backend
+from app.core.vector_store import get_vector_store
+from app.core.sparse_index import BM25Index
+from app.core.metrics import stage
 COLLECTION_NAME = "papers"
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '1024'))
+RETRIEVER_TOP_K = int(os.getenv('RETRIEVER_TOP_K', '5'))
+HYBRID_SEARCH = os.getenv('HYBRID_SEARCH', 'true').lower() == 'true'
+# each side of the hybrid search contributes this many candidates per result slot
+HYBRID_CANDIDATES_PER_SLOT = 4
+RRF_K = 60
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+class QueryEmbeddingCache:
+    """Bounded LRU cache of query embeddings keyed on (model name, normalized query)."""
+
+    def __init__(self, maxsize=QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model_name, query):
+        key = (model_name, normalize_query(query))
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return vector
+
+    def put(self, model_name, query, vector):
+        if self.maxsize <= 0:
+            return
+        key = (model_name, normalize_query(query))
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, model_name=None):
+        """Drop every entry, or only those for one embedding model."""
+        with self._lock:
+            if model_name is None:
+                self._entries.clear()
+                return
+            for key in [k for k in self._entries if k[0] == model_name]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+query_embedding_cache = QueryEmbeddingCache()
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse ranked lists of ids into one list of (id, score), best first"""
+    scores = {}
+    for ranking in rankings:
+        for rank, point_id in enumerate(ranking):
+            scores[point_id] = scores.get(point_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
 
 class Retriever:
-    def __init__(self, top_k=5):
-        self.client = QdrantClient(host=QDRANT_HOST, port = QDRANT_PORT)
-        self.model = SentenceTransformer(EMBEDDING_MODEL)
+    def __init__(self, top_k=RETRIEVER_TOP_K, cache=query_embedding_cache, embedder=None, store=None,
+                 hybrid=HYBRID_SEARCH):
+        self.store = store or get_vector_store(COLLECTION_NAME)
+        self.hybrid = hybrid
+        self.sparse_index = BM25Index(COLLECTION_NAME) if hybrid else None
+        # sparse lookups run here while the query is embedded and searched densely
+        self._sparse_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="sparse") if hybrid else None
+        self.embedder = embedder or get_embedding_backend()
+        # backend + model, since different backends produce slightly different vectors
+        self.model_name = self.embedder.cache_key
         self.top_k = top_k
         self.collection_name = COLLECTION_NAME
+        self.cache = cache
+
+    def embed_query(self, query):
+        """Return the query embedding, skipping the encode for repeated queries"""
+        vector = self.cache.get(self.model_name, query)
+        if vector is None:
+            vector = self.embedder.encode_one(normalize_query(query)).tolist()
+            self.cache.put(self.model_name, query, vector)
+        return vector
+
+    def _sparse_search(self, query, limit, timer=None):
+        with stage(timer, "sparse_search"):
+            return self.sparse_index.search(query, limit)
+
+    def search(self, query, timer=None):
+        """
+        Return (query vector, hits) for a query. Hits carry the dense similarity as score,
+        or None for chunks only found by the lexical index. Stage timings go to `timer`.
+        """
+        if not self.hybrid:
+            with stage(timer, "embed"):
+                query_vec = self.embed_query(query)
+            with stage(timer, "vector_search"):
+                return query_vec, self.store.search(query_vec, self.top_k)
+
+        candidates = self.top_k * HYBRID_CANDIDATES_PER_SLOT
+        sparse_future = self._sparse_pool.submit(self._sparse_search, query, candidates, timer)
+        with stage(timer, "embed"):
+            query_vec = self.embed_query(query)
+        with stage(timer, "vector_search"):
+            dense_hits = self.store.search(query_vec, candidates)
+        return query_vec, self._fuse([dense_hits], [sparse_future.result()])[0]
+
+    def _fuse(self, dense_results, sparse_results):
+        """Fuse each query's dense hits and lexical (id, score) results into its top_k hits"""
+        fused_lists = []
+        missing = set()
+        for dense_hits, sparse in zip(dense_results, sparse_results):
+            by_id = {hit.id: hit for hit in dense_hits}
+            fused = reciprocal_rank_fusion([[hit.id for hit in dense_hits], [point_id for point_id, _ in sparse]])
+            fused = [point_id for point_id, _ in fused[:self.top_k]]
+            missing.update(point_id for point_id in fused if point_id not in by_id)
+            fused_lists.append((by_id, fused))
+        # payloads of chunks only the lexical index found, fetched in one call for every query
+        fetched = {hit.id: hit for hit in self.store.retrieve(sorted(missing))} if missing else {}
+        return [
+            [by_id.get(point_id) or fetched[point_id] for point_id in fused if point_id in by_id or point_id in fetched]
+            for by_id, fused in fused_lists
+        ]
+
+    def embed_queries(self, queries):
+        """Embeddings for several queries, encoding all cache misses in one batch"""
+        vectors = [self.cache.get(self.model_name, query) for query in queries]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            encoded = self.embedder.encode([normalize_query(queries[i]) for i in missing])
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector.tolist()
+                self.cache.put(self.model_name, queries[i], vectors[i])
+        return vectors
+
+    def search_batch(self, queries, timer=None):
+        """Like search() for many queries: one encode call and one batched vector search"""
+        if not queries:
+            return []
+        limit = self.top_k * HYBRID_CANDIDATES_PER_SLOT if self.hybrid else self.top_k
+        sparse_futures = [self._sparse_pool.submit(self._sparse_search, query, limit, timer)
+                          for query in queries] if self.hybrid else None
+        with stage(timer, "embed"):
+            query_vecs = self.embed_queries(queries)
+        with stage(timer, "vector_search"):
+            dense_results = self.store.search_batch(query_vecs, limit)
+        if not self.hybrid:
+            return list(zip(query_vecs, dense_results))
+        fused = self._fuse(dense_results, [future.result() for future in sparse_futures])
+        return list(zip(query_vecs, fused))
 
-    def retrieve(self, query):
-        """Retrieve relevant chunks from Qdrant"""
-
-        query_vec = self.model.encode(query).tolist()
-
-        try:
-            results = self.client.query_points(
-                collection_name=self.collection_name,
-                query=query_vec,
-                limit=self.top_k,
-                with_payload=True
-            )
-
-            # extract contents from results
-            chunks = []
-            for result in results.points:
-                if result.payload:
-                    chunks.append(result.payload.get('content', ''))
-            return "\n".join(chunks)
-        
-        except Exception as e:
-            print(f"[ERROR] Qdrant retrieval failed: {e}")
-
-retriever_instance = Retriever()
-
-def retrieve_relevant_chunks(query):
-    return retriever_instance.retrieve(query)
+    def warmup(self):
+        """Run one dummy encode so the first real query doesn't pay for lazy initialisation"""
+        self.embedder.encode_one("warmup")
@@ -0,0 +1,64 @@
+import os
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+SESSION_MAX = int(os.getenv('SESSION_MAX', '1000'))
+SESSION_IDLE_TTL = float(os.getenv('SESSION_IDLE_TTL', '1800'))
+
+
+@dataclass
+class ConversationSession:
+    session_id: str
+    turns: List[Tuple[str, str]] = field(default_factory=list)
+    # token state Ollama returned after the last turn; sending it back lets the
+    # server continue from its KV cache instead of re-evaluating the whole prompt
+    ollama_context: Optional[List[int]] = None
+    last_used: float = field(default_factory=time.monotonic)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    def reset_context(self):
+        self.ollama_context = None
+
+
+class SessionStore:
+    """Bounded store of server-side conversations, evicting the least recently used and idle ones."""
+
+    def __init__(self, max_sessions=SESSION_MAX, idle_ttl=SESSION_IDLE_TTL):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if len(self._sessions) <= self.max_sessions and now - oldest.last_used <= self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+
+    def get_or_create(self, session_id: str) -> ConversationSession:
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or now - session.last_used > self.idle_ttl:
+                session = ConversationSession(session_id=session_id)
+                self._sessions[session_id] = session
+            session.last_used = now
+            self._sessions.move_to_end(session_id)
+            self._evict(now)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self):
+        with self._lock:
+            return {"sessions": len(self._sessions), "max_sessions": self.max_sessions, "idle_ttl": self.idle_ttl}
+
+
+session_store = SessionStore()
@@ -0,0 +1,191 @@
+import os
+import re
+import json
+import math
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import List, Tuple
+
+SPARSE_INDEX_DIR = os.getenv('SPARSE_INDEX_DIR', 'data/sparse_index')
+# the change log is folded into a new snapshot once it is larger than this and the snapshot
+COMPACT_MIN_BYTES = int(os.getenv('SPARSE_INDEX_COMPACT_BYTES', str(8 * 1024 * 1024)))
+
+# keeps identifiers such as "gpt-4", "llama3.1" or "f1_score" as single terms
+_TOKEN_RE = re.compile(r"\w+(?:[-.]\w+)*")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Inverted index over chunk text with Okapi BM25 scoring. It is written by the indexer
+    and read by the retriever; in the API server both share one instance.
+
+    On disk each collection has a snapshot (`<collection>.json`, point id -> term
+    frequencies) and an append-only log of changes since the snapshot
+    (`<collection>.log.jsonl`, one {"id", "terms"} line per added chunk and {"id"} per
+    removed one). save() only appends what changed, and other processes replay just the
+    new log lines; the log is folded into a fresh snapshot once it outgrows it.
+    """
+
+    def __init__(self, collection_name: str, index_dir: str = SPARSE_INDEX_DIR, k1: float = 1.5, b: float = 0.75):
+        self.path = Path(index_dir) / f"{collection_name}.json"
+        self.log_path = Path(index_dir) / f"{collection_name}.log.jsonl"
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._snapshot_mtime = None
+        self._log_offset = 0     # bytes of the log already applied
+        self._pending = []       # (point id, terms or None) not saved yet
+        self._cleared = False    # clear() since the last save
+        self._doc_terms = {}   # point id -> {term: tf}
+        self._doc_len = {}     # point id -> number of terms
+        self._postings = {}    # term -> {point id: tf}
+        self._total_len = 0
+        self._reload_if_changed()
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def _reload_if_changed(self):
+        try:
+            snapshot_mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            snapshot_mtime = None
+        if snapshot_mtime is not None and snapshot_mtime != self._snapshot_mtime:
+            try:
+                doc_terms = json.loads(self.path.read_text(encoding="utf-8"))
+            except (json.JSONDecodeError, FileNotFoundError):
+                return
+            self._reset()
+            for point_id, terms in doc_terms.items():
+                self._insert(point_id, terms)
+            self._snapshot_mtime = snapshot_mtime
+            self._log_offset = 0
+        self._replay_log()
+
+    def _replay_log(self):
+        try:
+            size = os.stat(self.log_path).st_size
+        except FileNotFoundError:
+            return
+        if size < self._log_offset:
+            # truncated by a compaction; replaying from the start is harmless since
+            # every entry sets or removes a whole document
+            self._log_offset = 0
+        if size == self._log_offset:
+            return
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read(size - self._log_offset)
+        # a line still being written is picked up next time
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            entry = json.loads(line)
+            self._remove(entry["id"])
+            if entry.get("terms") is not None:
+                self._insert(entry["id"], entry["terms"])
+        self._log_offset += end
+
+    def _reset(self):
+        self._doc_terms = {}
+        self._doc_len = {}
+        self._postings = {}
+        self._total_len = 0
+
+    def _insert(self, point_id, terms):
+        self._doc_terms[point_id] = terms
+        length = sum(terms.values())
+        self._doc_len[point_id] = length
+        self._total_len += length
+        for term, tf in terms.items():
+            self._postings.setdefault(term, {})[point_id] = tf
+
+    def _remove(self, point_id):
+        terms = self._doc_terms.pop(point_id, None)
+        if terms is None:
+            return False
+        self._total_len -= self._doc_len.pop(point_id)
+        for term in terms:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(point_id, None)
+                if not posting:
+                    del self._postings[term]
+        return True
+
+    def add(self, point_id: str, text: str):
+        with self._lock:
+            point_id = str(point_id)
+            terms = dict(Counter(tokenize(text)))
+            self._remove(point_id)
+            self._insert(point_id, terms)
+            self._pending.append((point_id, terms))
+
+    def remove(self, point_id: str):
+        with self._lock:
+            point_id = str(point_id)
+            if self._remove(point_id):
+                self._pending.append((point_id, None))
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._pending = []
+            self._cleared = True
+
+    def save(self):
+        """Persist the changes made since the last save"""
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if self._cleared or not self.path.exists():
+                self._write_snapshot()
+                return
+            if self._pending:
+                data = "".join(
+                    json.dumps({"id": point_id, "terms": terms} if terms is not None else {"id": point_id}) + "\n"
+                    for point_id, terms in self._pending
+                ).encode("utf-8")
+                with open(self.log_path, "ab") as f:
+                    f.write(data)
+                    self._log_offset = f.tell()
+                self._pending = []
+            if self._log_offset > max(COMPACT_MIN_BYTES, os.stat(self.path).st_size):
+                self._write_snapshot()
+
+    def _write_snapshot(self):
+        # snapshot first, then drop the log it contains: a reader in between replays
+        # entries that are already applied, which changes nothing
+        tmp_path = self.path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps(self._doc_terms), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+        with open(self.log_path, "wb"):
+            pass
+        self._snapshot_mtime = os.stat(self.path).st_mtime_ns
+        self._log_offset = 0
+        self._pending = []
+        self._cleared = False
+
+    def search(self, query: str, limit: int) -> List[Tuple[str, float]]:
+        """Return up to `limit` (point id, BM25 score) pairs, best first"""
+        with self._lock:
+            self._reload_if_changed()
+            n_docs = len(self._doc_terms)
+            if not n_docs:
+                return []
+            avg_len = self._total_len / n_docs
+
+            scores = {}
+            for term in set(tokenize(query)):
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for point_id, tf in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._doc_len[point_id] / avg_len)
+                    scores[point_id] = scores.get(point_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+            return sorted(scores.items(), key=lambda item: -item[1])[:limit]
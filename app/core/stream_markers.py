@@ -0,0 +1,68 @@
+"""
+In-band control markers in the /ask text stream.
+
+While a question waits for the model, the stream carries "\\x1equeue:N\\n" lines between
+answer tokens. HTTP clients see arbitrary chunk boundaries, so a marker can arrive split
+across chunks or glued to answer text; QueueMarkerParser takes care of both. Kept free
+of heavy imports so the frontend and benchmarks can use it too.
+"""
+import re
+from typing import List, Tuple
+
+QUEUE_MARKER_PREFIX = "\x1equeue:"
+_QUEUE_MARKER = re.compile(r"\x1equeue:(\d+)\n")
+
+
+def render_queue_marker(position: int) -> str:
+    return f"{QUEUE_MARKER_PREFIX}{position}\n"
+
+
+def _could_be_marker(rest: str) -> bool:
+    """Whether `rest` may still turn into a complete marker once more text arrives"""
+    if QUEUE_MARKER_PREFIX.startswith(rest):
+        return True
+    return rest.startswith(QUEUE_MARKER_PREFIX) and rest[len(QUEUE_MARKER_PREFIX):].isdigit()
+
+
+class QueueMarkerParser:
+    """
+    Splits a chunked text stream into answer text and queue positions.
+
+        parser = QueueMarkerParser()
+        for chunk in chunks:
+            text, positions = parser.feed(chunk)
+        text = parser.flush()
+    """
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> Tuple[str, List[int]]:
+        self._buffer += chunk
+        text = []
+        positions = []
+        while True:
+            start = self._buffer.find("\x1e")
+            if start == -1:
+                text.append(self._buffer)
+                self._buffer = ""
+                break
+            text.append(self._buffer[:start])
+            rest = self._buffer[start:]
+            match = _QUEUE_MARKER.match(rest)
+            if match:
+                positions.append(int(match.group(1)))
+                self._buffer = rest[match.end():]
+            elif _could_be_marker(rest):
+                # hold a partial marker back until the next chunk completes it
+                self._buffer = rest
+                break
+            else:
+                text.append(rest[0])
+                self._buffer = rest[1:]
+        return "".join(text), positions
+
+    def flush(self) -> str:
+        """Whatever is still held back once the stream has ended"""
+        text, self._buffer = self._buffer, ""
+        return text
@@ -0,0 +1,630 @@
+import os
+import json
+import uuid
+import logging
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+
+_log = logging.getLogger(__name__)
+
+VECTOR_STORE = os.getenv('VECTOR_STORE', 'qdrant')  # qdrant | local
+QDRANT_HOST = os.getenv('QDRANT_HOST', 'localhost')
+QDRANT_PORT = int(os.getenv('QDRANT_PORT', '6333'))
+# qdrant-client local mode instead of a server: ":memory:" or a directory path
+QDRANT_LOCATION = os.getenv('QDRANT_LOCATION', '')
+# collection layout, applied when a collection is created or by scripts.qdrant_storage
+QDRANT_QUANTIZATION = os.getenv('QDRANT_QUANTIZATION', 'none')  # none | scalar | binary
+QDRANT_ON_DISK = os.getenv('QDRANT_ON_DISK', 'false').lower() == 'true'
+QDRANT_ON_DISK_PAYLOAD = os.getenv('QDRANT_ON_DISK_PAYLOAD', 'false').lower() == 'true'
+QDRANT_HNSW_M = int(os.getenv('QDRANT_HNSW_M', '16'))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv('QDRANT_HNSW_EF_CONSTRUCT', '100'))
+# query time: 0 leaves hnsw_ef to the server; oversampling fetches that many times
+# more candidates from the quantized index before rescoring with the original vectors
+QDRANT_SEARCH_EF = int(os.getenv('QDRANT_SEARCH_EF', '0'))
+QDRANT_RESCORE = os.getenv('QDRANT_RESCORE', 'true').lower() == 'true'
+QDRANT_OVERSAMPLING = float(os.getenv('QDRANT_OVERSAMPLING', '2.0'))
+LOCAL_STORE_DIR = os.getenv('LOCAL_STORE_DIR', 'data/vector_store')
+LOCAL_INDEX_TYPE = os.getenv('LOCAL_INDEX_TYPE', 'flat')  # flat | ivf | hnsw
+
+
+@dataclass
+class SearchHit:
+    id: str
+    score: Optional[float]
+    payload: dict = field(default_factory=dict)
+
+
+class VectorStore(ABC):
+    """Storage and nearest-neighbour search over chunk embeddings for one collection."""
+
+    def __init__(self, collection_name: str):
+        self.collection_name = collection_name
+
+    @abstractmethod
+    def ensure_collection(self, dimension: int) -> bool:
+        """Create the collection if needed; returns True if it was created"""
+
+    @abstractmethod
+    def recreate_collection(self, dimension: int):
+        """Drop all points and start with an empty collection"""
+
+    @abstractmethod
+    def upsert(self, ids: List[str], vectors, payloads: List[dict], wait: bool = True):
+        """Insert points, replacing any stored under the same id"""
+
+    @abstractmethod
+    def delete(self, ids: List[str], wait: bool = True):
+        """Remove points by id; ids that are not stored are ignored"""
+
+    @abstractmethod
+    def search(self, vector, limit: int, exact: bool = False) -> List[SearchHit]:
+        """Nearest neighbours of `vector`; `exact` bypasses any approximate index, e.g. to measure recall"""
+
+    def search_batch(self, vectors, limit: int, exact: bool = False) -> List[List[SearchHit]]:
+        """Search several query vectors at once; one list of hits per vector"""
+        return [self.search(vector, limit, exact) for vector in vectors]
+
+    @abstractmethod
+    def retrieve(self, ids: List[str]) -> List[SearchHit]:
+        """Fetch stored payloads by id, without scores"""
+
+    def close(self):
+        pass
+
+
+@dataclass
+class QdrantStorageConfig:
+    """
+    How a Qdrant collection keeps its vectors. Quantized vectors stay in RAM for the
+    HNSW search while the original float32 vectors (and payloads) can live on disk,
+    read only to rescore the top candidates.
+    """
+    quantization: str = QDRANT_QUANTIZATION
+    on_disk: bool = QDRANT_ON_DISK
+    on_disk_payload: bool = QDRANT_ON_DISK_PAYLOAD
+    hnsw_m: int = QDRANT_HNSW_M
+    hnsw_ef_construct: int = QDRANT_HNSW_EF_CONSTRUCT
+    search_ef: int = QDRANT_SEARCH_EF
+    rescore: bool = QDRANT_RESCORE
+    oversampling: float = QDRANT_OVERSAMPLING
+
+    def __post_init__(self):
+        if self.quantization not in ("none", "scalar", "binary"):
+            raise ValueError(f"Unknown quantization '{self.quantization}', expected none, scalar or binary")
+
+    def vector_params(self, dimension):
+        from qdrant_client.models import VectorParams, Distance
+
+        return VectorParams(size=dimension, distance=Distance.COSINE, on_disk=self.on_disk)
+
+    def hnsw_config(self):
+        from qdrant_client.models import HnswConfigDiff
+
+        return HnswConfigDiff(m=self.hnsw_m, ef_construct=self.hnsw_ef_construct)
+
+    def quantization_config(self):
+        from qdrant_client.models import (
+            ScalarQuantization, ScalarQuantizationConfig, ScalarType, BinaryQuantization, BinaryQuantizationConfig
+        )
+
+        if self.quantization == "scalar":
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        if self.quantization == "binary":
+            return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+        return None
+
+    def search_params(self, exact=False):
+        from qdrant_client.models import SearchParams, QuantizationSearchParams
+
+        quantization = None
+        if self.quantization != "none":
+            # exact search also skips the quantized vectors, for a true ground truth
+            quantization = QuantizationSearchParams(
+                ignore=exact, rescore=self.rescore, oversampling=self.oversampling
+            )
+        if not (exact or quantization or self.search_ef):
+            return None  # server defaults
+        return SearchParams(hnsw_ef=self.search_ef or None, exact=exact, quantization=quantization)
+
+    def estimate_memory(self, points, dimension) -> dict:
+        """Rough RAM use in bytes of the vectors and HNSW graph for `points` vectors"""
+        original = points * dimension * 4
+        quantized = {"none": 0, "scalar": points * dimension, "binary": points * dimension // 8}[self.quantization]
+        # each node keeps up to 2m links on layer 0, stored as 4 byte ids
+        graph = points * self.hnsw_m * 2 * 4
+        in_ram = quantized + graph + (0 if self.on_disk else original)
+        return {"original_vectors": original, "quantized_vectors": quantized, "hnsw_graph": graph, "ram": in_ram}
+
+
+class QdrantVectorStore(VectorStore):
+    """Collection on a Qdrant server, or in qdrant-client's local mode when a location is given."""
+
+    def __init__(self, collection_name: str, host: str = QDRANT_HOST, port: int = QDRANT_PORT, client=None,
+                 location: str = QDRANT_LOCATION, config: Optional[QdrantStorageConfig] = None):
+        super().__init__(collection_name)
+        from qdrant_client import QdrantClient
+
+        if client is None:
+            client = QdrantClient(location=location) if location else QdrantClient(host=host, port=port)
+        self.client = client
+        self.config = config or QdrantStorageConfig()
+
+    def _create_collection(self, dimension):
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config=self.config.vector_params(dimension),
+            hnsw_config=self.config.hnsw_config(),
+            quantization_config=self.config.quantization_config(),
+            on_disk_payload=self.config.on_disk_payload
+        )
+
+    def ensure_collection(self, dimension):
+        if self.client.collection_exists(self.collection_name):
+            return False
+        self._create_collection(dimension)
+        return True
+
+    def recreate_collection(self, dimension):
+        try:
+            self.client.delete_collection(collection_name=self.collection_name)
+        except Exception as e:
+            _log.warning(f"Could not delete collection: {str(e)}")
+        self._create_collection(dimension)
+
+    def apply_config(self):
+        """
+        Bring an existing collection to the current config. Qdrant rebuilds the HNSW
+        index and quantized vectors in the background; points stay searchable meanwhile.
+        """
+        from qdrant_client.models import VectorParamsDiff, CollectionParamsDiff, Disabled
+
+        self.client.update_collection(
+            collection_name=self.collection_name,
+            vectors_config={"": VectorParamsDiff(on_disk=self.config.on_disk)},
+            hnsw_config=self.config.hnsw_config(),
+            quantization_config=self.config.quantization_config() or Disabled.DISABLED,
+            collection_params=CollectionParamsDiff(on_disk_payload=self.config.on_disk_payload)
+        )
+
+    def collection_info(self) -> dict:
+        from qdrant_client.models import ScalarQuantization, BinaryQuantization
+
+        info = self.client.get_collection(self.collection_name)
+        vectors = info.config.params.vectors
+        quantization = info.config.quantization_config
+        if quantization is None:
+            quantization = "none"
+        elif isinstance(quantization, (ScalarQuantization, BinaryQuantization)):
+            quantization = "scalar" if isinstance(quantization, ScalarQuantization) else "binary"
+        else:
+            quantization = type(quantization).__name__
+        return {
+            "status": getattr(info.status, "value", str(info.status)),
+            "points": info.points_count or 0,
+            "dimension": vectors.size,
+            "on_disk": bool(vectors.on_disk),
+            "on_disk_payload": bool(info.config.params.on_disk_payload),
+            "hnsw": {"m": info.config.hnsw_config.m, "ef_construct": info.config.hnsw_config.ef_construct},
+            "quantization": quantization,
+        }
+
+    def upsert(self, ids, vectors, payloads, wait=True):
+        from qdrant_client.models import PointStruct
+
+        points = [
+            PointStruct(id=point_id, vector=np.asarray(vector).tolist(), payload=payload)
+            for point_id, vector, payload in zip(ids, vectors, payloads)
+        ]
+        self.client.upsert(collection_name=self.collection_name, points=points, wait=wait)
+
+    def delete(self, ids, wait=True):
+        from qdrant_client.models import PointIdsList
+
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=PointIdsList(points=list(ids)),
+            wait=wait
+        )
+
+    def search(self, vector, limit, exact=False):
+        results = self.client.query_points(
+            collection_name=self.collection_name,
+            query=np.asarray(vector).tolist(),
+            limit=limit,
+            search_params=self.config.search_params(exact),
+            with_payload=True
+        )
+        return [SearchHit(id=str(p.id), score=p.score, payload=p.payload or {}) for p in results.points]
+
+    def search_batch(self, vectors, limit, exact=False):
+        from qdrant_client.models import QueryRequest
+
+        if not len(vectors):
+            return []
+        params = self.config.search_params(exact)
+        # a single round trip for the whole batch
+        responses = self.client.query_batch_points(
+            collection_name=self.collection_name,
+            requests=[
+                QueryRequest(query=np.asarray(vector).tolist(), limit=limit, params=params, with_payload=True)
+                for vector in vectors
+            ]
+        )
+        return [
+            [SearchHit(id=str(p.id), score=p.score, payload=p.payload or {}) for p in response.points]
+            for response in responses
+        ]
+
+    def retrieve(self, ids):
+        records = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=list(ids),
+            with_payload=True
+        )
+        return [SearchHit(id=str(r.id), score=None, payload=r.payload or {}) for r in records]
+
+    def close(self):
+        self.client.close()
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process store for single-node deployments and CI.
+
+    Layout under `<root>/<collection>/`, where <gen> changes on every compaction:
+      meta.json            dimension and current generation; replaced only on compaction
+      vectors.<gen>.f32    unit-normalized float32 rows, appended and read through np.memmap
+      docstore.<gen>.jsonl one JSON payload per row, read by byte offset
+      rows.<gen>.jsonl     append-only row log: ["+", id, payload offset, payload length]
+                           adds the next row, ["-", row] marks a row dead
+      faiss.<gen>.index    optional IVF/HNSW index over the first rows
+
+    Writes only append. Dead rows are masked at query time, and rows added after the
+    ANN index was built are add()ed to it; it is rebuilt only when the files are
+    compacted (once more than half the rows are dead) or when an IVF index has outgrown
+    its training. Readers in other processes replay the row log from where they left
+    off and reload everything when meta.json changes; the previous generation's files
+    are kept so a reader that has not noticed a compaction yet can finish its search.
+    """
+
+    def __init__(self, collection_name: str, root: str = LOCAL_STORE_DIR, index_type: str = LOCAL_INDEX_TYPE):
+        super().__init__(collection_name)
+        if index_type not in ("flat", "ivf", "hnsw"):
+            raise ValueError(f"Unknown local index type '{index_type}'")
+        self.index_type = index_type
+        self.dir = Path(root) / collection_name
+        self.meta_path = self.dir / "meta.json"
+        self._lock = threading.RLock()
+        self._meta_mtime = None
+        self._generation = None
+        self._dimension = None
+        self._rows = []          # [id, offset, length, alive]
+        self._row_of = {}        # id -> row number of the live row
+        self._rows_offset = 0    # bytes of the row log applied
+        self._vectors = None     # memmap, opened lazily
+        self._ann = None         # faiss index, loaded or built lazily
+        self._ann_mtime = None
+
+    def _file(self, kind, suffix, generation=None):
+        return self.dir / f"{kind}.{generation or self._generation}.{suffix}"
+
+    @property
+    def vectors_path(self):
+        return self._file("vectors", "f32")
+
+    @property
+    def docstore_path(self):
+        return self._file("docstore", "jsonl")
+
+    @property
+    def rows_path(self):
+        return self._file("rows", "jsonl")
+
+    @property
+    def faiss_path(self):
+        return self._file("faiss", "index")
+
+    # -- persistence -------------------------------------------------------
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.stat(self.meta_path).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._meta_mtime:
+            meta = json.loads(self.meta_path.read_text(encoding="utf-8"))
+            self._dimension = meta["dimension"]
+            self._generation = meta["generation"]
+            self._rows = []
+            self._row_of = {}
+            self._rows_offset = 0
+            self._vectors = None
+            self._ann = None
+            self._meta_mtime = mtime
+        self._replay_rows()
+        if self._ann is not None and self._faiss_mtime() != self._ann_mtime:
+            # another process rebuilt it
+            self._ann = None
+
+    def _replay_rows(self):
+        try:
+            size = os.stat(self.rows_path).st_size
+        except FileNotFoundError:
+            return
+        if size == self._rows_offset:
+            return
+        with open(self.rows_path, "rb") as f:
+            f.seek(self._rows_offset)
+            data = f.read(size - self._rows_offset)
+        # a line still being written is picked up next time
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            self._apply_row_entry(json.loads(line))
+        self._rows_offset += end
+        self._vectors = None
+
+    def _apply_row_entry(self, entry):
+        if entry[0] == "+":
+            _, point_id, offset, length = entry
+            old_row = self._row_of.get(point_id)
+            if old_row is not None:
+                self._rows[old_row][3] = False
+            self._row_of[point_id] = len(self._rows)
+            self._rows.append([point_id, offset, length, True])
+        else:
+            row = self._rows[entry[1]]
+            row[3] = False
+            if self._row_of.get(row[0]) == entry[1]:
+                del self._row_of[row[0]]
+
+    def _append_rows(self, entries):
+        if not entries:
+            return
+        data = "".join(json.dumps(entry) + "\n" for entry in entries).encode("utf-8")
+        with open(self.rows_path, "ab") as f:
+            f.write(data)
+            self._rows_offset = f.tell()
+
+    def _write_meta(self, generation):
+        tmp_path = self.meta_path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps({"dimension": self._dimension, "generation": generation}), encoding="utf-8")
+        os.replace(tmp_path, self.meta_path)
+        previous = self._generation
+        self._generation = generation
+        self._meta_mtime = os.stat(self.meta_path).st_mtime_ns
+        # keep the previous generation for readers that are still on it, drop older ones
+        for path in self.dir.glob("*.*.*"):
+            if path.name.split(".")[1] not in (generation, previous):
+                path.unlink(missing_ok=True)
+
+    def _matrix(self):
+        if self._vectors is None and self._rows:
+            self._vectors = np.memmap(
+                self.vectors_path, dtype=np.float32, mode="r", shape=(len(self._rows), self._dimension)
+            )
+        return self._vectors
+
+    def _read_payload(self, row):
+        _, offset, length, _ = row
+        with open(self.docstore_path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    # -- collection management ---------------------------------------------
+
+    def ensure_collection(self, dimension):
+        with self._lock:
+            self._reload_if_changed()
+            if self.meta_path.exists():
+                return False
+            self.recreate_collection(dimension)
+            return True
+
+    def recreate_collection(self, dimension):
+        with self._lock:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            generation = uuid.uuid4().hex[:12]
+            for kind, suffix in (("vectors", "f32"), ("docstore", "jsonl"), ("rows", "jsonl")):
+                self._file(kind, suffix, generation).write_bytes(b"")
+            self._rows = []
+            self._row_of = {}
+            self._dimension = dimension
+            self._write_meta(generation)
+            self._rows_offset = 0
+            self._vectors = None
+            self._ann = None
+            self._ann_mtime = None
+
+    def upsert(self, ids, vectors, payloads, wait=True):
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.clip(norms, 1e-12, None)
+        with self._lock:
+            self._reload_if_changed()
+            entries = []
+            # vectors and payloads are on disk before the row log points at them
+            with open(self.vectors_path, "ab") as vf, open(self.docstore_path, "ab") as df:
+                offset = df.tell()
+                for point_id, vector, payload in zip(ids, vectors, payloads):
+                    data = (json.dumps(payload) + "\n").encode("utf-8")
+                    df.write(data)
+                    vf.write(vector.tobytes())
+                    entries.append(["+", str(point_id), offset, len(data)])
+                    offset += len(data)
+            for entry in entries:
+                self._apply_row_entry(entry)
+            self._append_rows(entries)
+            self._vectors = None
+            self._maybe_compact()
+
+    def delete(self, ids, wait=True):
+        with self._lock:
+            self._reload_if_changed()
+            entries = []
+            for point_id in ids:
+                row = self._row_of.get(str(point_id))
+                if row is not None:
+                    entries.append(["-", row])
+                    self._apply_row_entry(entries[-1])
+            self._append_rows(entries)
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        if self._rows and len(self._row_of) * 2 < len(self._rows):
+            self._compact()
+        elif self.index_type == "ivf" and self._row_of:
+            index = self._ann_index(self._matrix())
+            # IVF lists are trained for about nlist**2 rows; retrain once far past that
+            if index.nlist ** 2 * 4 < len(self._rows):
+                self._build_ann(self._matrix())
+
+    def _compact(self):
+        matrix = self._matrix()
+        generation = uuid.uuid4().hex[:12]
+        rows = []
+        with open(self._file("vectors", "f32", generation), "wb") as vf, \
+                open(self._file("docstore", "jsonl", generation), "wb") as df, \
+                open(self.docstore_path, "rb") as old:
+            for i, (point_id, offset, length, alive) in enumerate(self._rows):
+                if not alive:
+                    continue
+                old.seek(offset)
+                data = old.read(length)
+                rows.append([point_id, df.tell(), length, True])
+                df.write(data)
+                vf.write(np.asarray(matrix[i]).tobytes())
+        self._file("rows", "jsonl", generation).write_text(
+            "".join(json.dumps(["+", point_id, offset, length]) + "\n" for point_id, offset, length, _ in rows),
+            encoding="utf-8"
+        )
+        self._write_meta(generation)
+        self._rows = rows
+        self._row_of = {row[0]: i for i, row in enumerate(rows)}
+        self._rows_offset = os.stat(self.rows_path).st_size
+        self._vectors = None
+        self._ann = None
+        self._ann_mtime = None
+        if self.index_type != "flat" and rows:
+            self._build_ann(self._matrix())
+
+    # -- search ------------------------------------------------------------
+
+    def _faiss_mtime(self):
+        try:
+            return os.stat(self.faiss_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _build_ann(self, matrix):
+        import faiss
+
+        data = np.ascontiguousarray(matrix, dtype=np.float32)
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(self._dimension, 32, faiss.METRIC_INNER_PRODUCT)
+        else:
+            nlist = max(1, int(np.sqrt(len(data))))
+            quantizer = faiss.IndexFlatIP(self._dimension)
+            index = faiss.IndexIVFFlat(quantizer, self._dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+            index.train(data)
+            index.nprobe = max(1, nlist // 8)
+        index.add(data)
+        self._save_ann(index)
+        return index
+
+    def _save_ann(self, index):
+        import faiss
+
+        tmp_path = self.faiss_path.with_suffix(".index.tmp")
+        faiss.write_index(index, str(tmp_path))
+        os.replace(tmp_path, self.faiss_path)
+        self._ann = index
+        self._ann_mtime = self._faiss_mtime()
+
+    def _ann_index(self, matrix):
+        try:
+            import faiss
+        except ImportError as e:
+            raise ImportError(f"LOCAL_INDEX_TYPE={self.index_type} requires the faiss-cpu package") from e
+
+        if self._ann is None and self.faiss_path.exists():
+            self._ann = faiss.read_index(str(self.faiss_path))
+            self._ann_mtime = self._faiss_mtime()
+        if self._ann is None or self._ann.ntotal > len(self._rows):
+            return self._build_ann(matrix)
+        if self._ann.ntotal < len(self._rows):
+            # rows appended since the index was built; dead ones among them are masked at query time
+            self._ann.add(np.ascontiguousarray(matrix[self._ann.ntotal:], dtype=np.float32))
+        return self._ann
+
+    def search(self, vector, limit, exact=False):
+        return self.search_batch([vector], limit, exact)[0]
+
+    def search_batch(self, vectors, limit, exact=False):
+        if not len(vectors):
+            return []
+        queries = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        with self._lock:
+            self._reload_if_changed()
+            matrix = self._matrix()
+            if matrix is None or not self._row_of:
+                return [[] for _ in range(len(queries))]
+
+            if self.index_type == "flat" or exact:
+                # one matrix product scores every query against every row
+                scores = queries @ matrix.T
+                alive = np.fromiter((row[3] for row in self._rows), dtype=bool, count=len(self._rows))
+                scores[:, ~alive] = -np.inf
+                k = min(limit, len(self._row_of))
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                candidate_lists = [
+                    sorted(((int(i), float(row_scores[i])) for i in row_top), key=lambda x: -x[1])
+                    for row_scores, row_top in zip(scores, top)
+                ]
+            else:
+                # over-fetch so dead rows can be skipped
+                k = min(len(self._rows), limit + (len(self._rows) - len(self._row_of)))
+                scores, idx = self._ann_index(matrix).search(queries, k)
+                candidate_lists = [
+                    [(int(i), float(s)) for i, s in zip(row_idx, row_scores) if i >= 0]
+                    for row_idx, row_scores in zip(idx, scores)
+                ]
+
+            results = []
+            for candidates in candidate_lists:
+                hits = []
+                for row_no, score in candidates:
+                    row = self._rows[row_no]
+                    if not row[3]:
+                        continue
+                    hits.append(SearchHit(id=row[0], score=score, payload=self._read_payload(row)))
+                    if len(hits) >= limit:
+                        break
+                results.append(hits)
+            return results
+
+    def retrieve(self, ids):
+        with self._lock:
+            self._reload_if_changed()
+            hits = []
+            for point_id in ids:
+                row = self._row_of.get(str(point_id))
+                if row is not None:
+                    hits.append(SearchHit(id=str(point_id), score=None, payload=self._read_payload(self._rows[row])))
+            return hits
+
+
+def get_vector_store(collection_name: str, backend: str = None, **kwargs) -> VectorStore:
+    """Build the configured store (VECTOR_STORE) for a collection"""
+    backend = backend or VECTOR_STORE
+    if backend == "qdrant":
+        return QdrantVectorStore(collection_name, **kwargs)
+    if backend == "local":
+        return LocalVectorStore(collection_name, **kwargs)
+    raise ValueError(f"Unknown vector store '{backend}', expected 'qdrant' or 'local'")
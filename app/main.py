@@ -1,8 +1,38 @@
-
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from app.api.routes import router as api_router  # ✅ Correct import
+from app.core.inference import close_ollama_client
+from app.core.feedback import feedback_writer, migrate_legacy_log
+from app.core.registry import registry, WARMUP_ON_STARTUP
+from app.core.ingest_jobs import ingest_jobs
+
+# set LOG_LEVEL=DEBUG to log full prompts and per-request prompt budgets
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    migrate_legacy_log()
+    feedback_writer.start()
+    ingest_jobs.start()
+    # warm up in the background so the server starts accepting connections immediately
+    warmup_task = asyncio.create_task(registry.warmup()) if WARMUP_ON_STARTUP else None
+    yield
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    # release pooled Ollama connections on shutdown
+    await close_ollama_client()
+    feedback_writer.stop()
+    ingest_jobs.stop()
+    registry.close()
 
-app = FastAPI(title="LLM Research Assistant", version="1.0")
+
+app = FastAPI(title="LLM Research Assistant", version="1.0", lifespan=lifespan)
 
 # ✅ Register routes under the /api prefix
 app.include_router(api_router, prefix="/api")
@@ -10,3 +40,19 @@ app.include_router(api_router, prefix="/api")
 @app.get("/")
 def read_root():
     return {"message": "LLM Research Assistant API is running"}
+
+@app.get("/health")
+def health():
+    """The process is up and serving requests"""
+    return {"status": "ok"}
+
+@app.get("/ready")
+def ready():
+    """Models are loaded and warm"""
+    status = registry.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus metrics"""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
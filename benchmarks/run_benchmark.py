@@ -0,0 +1,312 @@
+"""
+Offline load test of the serving path: app.main:app against a stub Ollama and an
+in-memory Qdrant collection seeded from the PDFs in data/arxiv_papers.
+
+    HF_HUB_OFFLINE=1 python -m benchmarks.run_benchmark --concurrency 8 --requests 200
+    python -m benchmarks.run_benchmark --baseline benchmarks/results/baseline.json
+
+Reports throughput and p50/p95/p99 time-to-first-token and total latency, writes them
+as JSON and, given a baseline, exits non-zero when a metric regressed beyond --tolerance.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import asyncio
+import argparse
+import logging
+import platform
+import tempfile
+import threading
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+PAPERS_DIR = REPO_ROOT / "data/arxiv_papers"
+RESULTS_DIR = REPO_ROOT / "benchmarks/results"
+SEED_NAMESPACE = uuid.UUID("0b1e6d4c-3c55-4a55-9d61-0d5f3a0c9b12")
+
+QUESTIONS = [
+    "What problem does the paper address?",
+    "Which datasets are used in the evaluation?",
+    "How does the proposed method compare to the baselines?",
+    "What are the main limitations mentioned by the authors?",
+    "Which model architecture is used?",
+    "How is the training data collected?",
+    "What evaluation metrics are reported?",
+    "What is the main contribution of the paper?",
+    "How large are the models that were evaluated?",
+    "What future work do the authors suggest?",
+]
+
+_log = logging.getLogger("benchmark")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def configure_environment(args, workdir, stub_port):
+    """Point the app at the stub and at throwaway state; must run before app modules are imported"""
+    os.environ["OLLAMA_URL"] = f"http://127.0.0.1:{stub_port}"
+    os.environ["VECTOR_STORE"] = "qdrant"
+    os.environ["QDRANT_LOCATION"] = ":memory:"
+    os.environ["WARMUP_ON_STARTUP"] = "true"
+    os.environ["ANSWER_CACHE_SIZE"] = os.environ.get("ANSWER_CACHE_SIZE", "512") if args.answer_cache else "0"
+    os.environ["STUB_TOKENS_PER_SEC"] = str(args.tokens_per_sec)
+    os.environ["STUB_NUM_TOKENS"] = str(args.num_tokens)
+    os.environ["STUB_PROMPT_EVAL_MS"] = str(args.prompt_eval_ms)
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("ONNX_CACHE_DIR", str(REPO_ROOT / "models/onnx"))
+    # the app keeps its state (feedback log, sparse index, collection versions) in
+    # paths relative to the working directory, so run it from a scratch directory
+    os.chdir(workdir)
+
+
+def sample_chunks(limit, chunk_words=200):
+    import fitz  # PyMuPDF
+
+    chunks = []
+    for pdf_path in sorted(PAPERS_DIR.glob("*.pdf")):
+        with fitz.open(pdf_path) as doc:
+            words = " ".join(page.get_text() for page in doc).split()
+        for i in range(0, len(words), chunk_words):
+            chunks.append((pdf_path.name, " ".join(words[i:i + chunk_words])))
+            if len(chunks) >= limit:
+                return chunks
+    return chunks
+
+
+def seed_collection(max_chunks):
+    """Embed the sample papers into the retriever's in-memory collection and sparse index"""
+    from app.core.registry import registry
+
+    retriever = registry.get_retriever()
+    chunks = sample_chunks(max_chunks)
+    if not chunks:
+        raise SystemExit(f"no PDFs found in {PAPERS_DIR}")
+
+    vectors = retriever.embedder.encode([text for _, text in chunks])
+    ids = [str(uuid.uuid5(SEED_NAMESPACE, f"{source}\x1f{text}")) for source, text in chunks]
+    payloads = [{"content": text, "source": source} for source, text in chunks]
+
+    retriever.store.ensure_collection(retriever.embedder.dimension)
+    retriever.store.upsert(ids, vectors, payloads)
+    if retriever.sparse_index is not None:
+        for point_id, (_, text) in zip(ids, chunks):
+            retriever.sparse_index.add(point_id, text)
+        retriever.sparse_index.save()
+    return len(chunks)
+
+
+def start_server(app, port):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"server on port {port} failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+async def wait_until_ready(client, timeout=300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        response = await client.get("/ready")
+        if response.status_code == 200:
+            return
+        await asyncio.sleep(0.5)
+    raise RuntimeError("app did not become ready")
+
+
+async def one_request(client, question, session_id=None):
+    from app.core.stream_markers import QueueMarkerParser
+
+    body = {"query": question}
+    if session_id:
+        body["session_id"] = session_id
+    started = time.perf_counter()
+    ttft = None
+    received = 0
+    # queue position markers are not answer tokens, but may share a chunk with some
+    markers = QueueMarkerParser()
+    async with client.stream("POST", "/api/ask", json=body) as response:
+        async for chunk in response.aiter_text():
+            text, _ = markers.feed(chunk)
+            if not text:
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            received += len(text)
+        received += len(markers.flush())
+        ok = response.status_code == 200
+        rejected = response.status_code == 429
+    return {
+        "ok": ok,
+        "rejected": rejected,
+        "ttft": ttft,
+        "latency": time.perf_counter() - started,
+        "chars": received,
+        "server_timing": response.headers.get("server-timing", ""),
+    }
+
+
+async def run_load(base_url, args):
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    timeout = httpx.Timeout(args.request_timeout, connect=10)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        await wait_until_ready(client)
+        for i in range(args.warmup):
+            await one_request(client, QUESTIONS[i % len(QUESTIONS)])
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def worker(i):
+            question = QUESTIONS[i % len(QUESTIONS)]
+            if not args.answer_cache:
+                # vary the text so repeated questions don't all hit the same cached embedding
+                question = f"{question} (#{i})"
+            session_id = f"bench-{i % args.sessions}" if args.sessions else None
+            async with semaphore:
+                try:
+                    return await one_request(client, question, session_id)
+                except Exception as e:
+                    return {"ok": False, "error": repr(e)}
+
+        started = time.perf_counter()
+        samples = await asyncio.gather(*(worker(i) for i in range(args.requests)))
+        wall = time.perf_counter() - started
+    return samples, wall
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(samples, wall):
+    ok = [s for s in samples if s.get("ok")]
+    ttfts = [s["ttft"] for s in ok if s["ttft"] is not None]
+    latencies = [s["latency"] for s in ok]
+    summary = {
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "rejected": sum(1 for s in samples if s.get("rejected")),
+        "wall_seconds": wall,
+        "throughput_rps": len(ok) / wall if wall else 0.0,
+    }
+    for name, values in (("ttft", ttfts), ("latency", latencies)):
+        for pct in (50, 95, 99):
+            summary[f"{name}_p{pct}"] = percentile(values, pct)
+    return summary
+
+
+# metrics where a larger value is worse; the rest (throughput) regress when they drop
+LOWER_IS_BETTER = ("ttft_p50", "ttft_p95", "ttft_p99", "latency_p50", "latency_p95", "latency_p99")
+
+
+def compare(summary, baseline, tolerance):
+    """Return a list of human readable regressions against a baseline summary"""
+    regressions = []
+    for key in LOWER_IS_BETTER + ("throughput_rps",):
+        current, previous = summary.get(key), baseline.get(key)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        worse = change > tolerance if key in LOWER_IS_BETTER else change < -tolerance
+        if worse:
+            regressions.append(f"{key}: {previous:.4f} -> {current:.4f} ({change:+.1%})")
+    if summary["errors"] > baseline.get("errors", 0):
+        regressions.append(f"errors: {baseline.get('errors', 0)} -> {summary['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=3, help="unmeasured requests sent first")
+    parser.add_argument("--sessions", type=int, default=0,
+                        help="spread requests over this many server-side conversations (0: stateless)")
+    parser.add_argument("--answer-cache", action="store_true", help="leave the semantic answer cache on")
+    parser.add_argument("--tokens-per-sec", type=float, default=30.0, help="stub decode rate")
+    parser.add_argument("--num-tokens", type=int, default=64, help="tokens the stub streams per answer")
+    parser.add_argument("--prompt-eval-ms", type=float, default=150.0, help="stub delay before the first token")
+    parser.add_argument("--max-chunks", type=int, default=2000, help="chunks seeded into the collection")
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--output", type=Path, help="where to write results (default: benchmarks/results/<time>.json)")
+    parser.add_argument("--baseline", type=Path, help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed relative regression")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    # resolve user paths before moving to the scratch directory
+    output = (args.output or RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json").resolve()
+    baseline_path = args.baseline.resolve() if args.baseline else None
+    sys.path.insert(0, str(REPO_ROOT))
+    workdir = tempfile.mkdtemp(prefix="rag-bench-")
+    stub_port, app_port = free_port(), free_port()
+    configure_environment(args, workdir, stub_port)
+
+    from benchmarks.stub_ollama import app as stub_app
+    from app.main import app
+
+    seed_started = time.perf_counter()
+    chunks = seed_collection(args.max_chunks)
+    _log.info(f"Seeded {chunks} chunks in {time.perf_counter() - seed_started:.1f}s")
+
+    stub_server, stub_thread = start_server(stub_app, stub_port)
+    app_server, app_thread = start_server(app, app_port)
+    try:
+        samples, wall = asyncio.run(run_load(f"http://127.0.0.1:{app_port}", args))
+    finally:
+        app_server.should_exit = True
+        stub_server.should_exit = True
+        app_thread.join(timeout=10)
+        stub_thread.join(timeout=10)
+
+    summary = summarize(samples, wall)
+    result = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "embedding_backend": os.getenv("EMBEDDING_BACKEND", "torch"),
+            "hybrid_search": os.getenv("HYBRID_SEARCH", "true"),
+        },
+        "seeded_chunks": chunks,
+        "summary": summary,
+    }
+    _log.info(json.dumps(summary, indent=2))
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    _log.info(f"Results written to {output}")
+
+    if baseline_path:
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))["summary"]
+        regressions = compare(summary, baseline, args.tolerance)
+        if regressions:
+            for line in regressions:
+                _log.error(f"Regression: {line}")
+            sys.exit(1)
+        _log.info(f"No regressions against {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
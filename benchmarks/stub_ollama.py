@@ -0,0 +1,46 @@
+"""
+Minimal stand-in for Ollama's /api/generate that streams tokens at a fixed rate.
+
+    uvicorn benchmarks.stub_ollama:app --port 11500
+
+Rates are read from STUB_TOKENS_PER_SEC, STUB_NUM_TOKENS and STUB_PROMPT_EVAL_MS.
+"""
+import os
+import json
+import asyncio
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+TOKENS_PER_SEC = float(os.getenv('STUB_TOKENS_PER_SEC', '30'))
+NUM_TOKENS = int(os.getenv('STUB_NUM_TOKENS', '64'))
+PROMPT_EVAL_MS = float(os.getenv('STUB_PROMPT_EVAL_MS', '150'))
+
+app = FastAPI(title="Stub Ollama")
+
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    body = await request.json()
+
+    # a request without a prompt only loads the model
+    if not body.get("prompt"):
+        return {"model": body.get("model"), "done": True, "response": ""}
+
+    num_tokens = min(NUM_TOKENS, body.get("options", {}).get("num_predict", NUM_TOKENS))
+
+    async def stream():
+        await asyncio.sleep(PROMPT_EVAL_MS / 1000)
+        started = time.perf_counter()
+        for i in range(num_tokens):
+            yield json.dumps({"response": f" tok{i}", "done": False}) + "\n"
+            await asyncio.sleep(1 / TOKENS_PER_SEC)
+        yield json.dumps({
+            "response": "",
+            "done": True,
+            "context": list(range(num_tokens)),
+            "eval_count": num_tokens,
+            "eval_duration": int((time.perf_counter() - started) * 1e9),
+        }) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -10,11 +10,14 @@ from pathlib import Path
 import sys
 from streamlit_extras.bottom_container import bottom
 import requests
-from scripts.ingest3 import DocumentProcessor, QdrantIndexer
+import uuid
+import json
+from app.core.stream_markers import QueueMarkerParser
 # load_dotenv()
 
 API_URL = "http://localhost:8000/api/ask"
 FEEDBACK_URL = "http://localhost:8000/api/feedback"
+INGEST_URL = "http://localhost:8000/api/ingest"
 st.set_page_config(
     page_title = "Research Assistant",
     layout="wide"
@@ -22,53 +25,57 @@ st.set_page_config(
 st.title("Research Assistant")
 
 def process_and_index():
-    processor = DocumentProcessor()
-    indexer = QdrantIndexer(collection_name="papers")
-    
+    """Submit the uploads and URLs as an ingestion job on the API server and follow its progress"""
     if st.button("Reset Index"):
         # clear old data before indexing new documents
-        indexer.clear_collection()
-
-    full_markdown = ""
-    docs_to_index = []
-
-    # Process uploaded files
-    if st.session_state.uploaded_files:
-        _, docs = processor.process_uploaded_files(st.session_state.uploaded_files)
-        # full_markdown += md + "\n"
-        docs_to_index.extend(docs)
-
-    # Process URLs
-    if st.session_state.get("file_urls"):
-        _, docs = processor.process_urls(st.session_state.file_urls)
-        # full_markdown += md + "\n"
-        docs_to_index.extend(docs)
-
-    # for doc in docs_to_index:
-    #     indexer.index_document(
-    #         markdown_text=doc['markdown'],
-    #         doc_obj=doc['doc'],
-    #         source_name=doc['filename']
-    #     )
-
-    total_chunks = 0
-    for doc in docs_to_index:
-        count = indexer.index_document(
-            doc_obj=doc['doc'],
-            source_name=doc['filename'] 
-        )
-        total_chunks+=count
-    st.success(f"Indexed {total_chunks} chunks successfully.")
+        requests.post(f"{INGEST_URL}/reset", timeout=60).raise_for_status()
+
+    files = [
+        ("files", (f.name, f.getvalue(), f.type or "application/pdf"))
+        for f in st.session_state.uploaded_files or []
+    ]
+    urls = st.session_state.get("file_urls") or []
+    response = requests.post(INGEST_URL, files=files or None, data={"urls": urls}, timeout=300)
+    response.raise_for_status()
+    job = response.json()
+
+    # conversion and indexing run on the server; this only shows progress
+    progress = st.progress(0.0)
+    status = st.empty()
+    finished = 0
+    result = {}
+    with requests.get(f"{INGEST_URL}/{job['job_id']}/events", stream=True, timeout=None) as events:
+        events.raise_for_status()
+        for line in events.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            event = json.loads(line)
+            if "job_id" in event:
+                result = event
+                break
+            if event["status"] == "failed":
+                st.warning(f"{event['source']}: {event['stage']} failed ({event['detail']})")
+            if event["status"] in ("failed", "skipped") or (event["stage"] == "upsert" and event["status"] == "done"):
+                finished += 1
+                progress.progress(min(1.0, finished / max(1, job["documents"])))
+            status.markdown(f"`{event['source']}`: {event['stage']} {event['status']}")
+    status.empty()
+
+    if result.get("status") != "completed":
+        raise RuntimeError(result.get("error") or f"ingest job ended as {result.get('status', 'unknown')}")
+    st.success(f"Indexed {result['chunks']} chunks successfully.")
     
-    return indexer
+    return job["job_id"]
 
 
-def stream_response_from_api(query:str, max_retries: int = 5, backoff_factor:int = 2, initial_delay: float=1.0):
+def stream_response_from_api(query:str, session_id: str = None, max_retries: int = 5, backoff_factor:int = 2, initial_delay: float=1.0, on_queue_position=None):
     """
     Generator that streams tokens from the FASTAPI backend with retry on connections errors
     Yields token one by one fore real-time display.
+    The conversation history lives on the server under `session_id`, so only the new question is sent.
+    Queue position updates are passed to `on_queue_position` instead of being yielded.
     """
-    payload = {"query": query}
+    payload = {"query": query, "session_id": session_id}
     attempt = 0
     delay = initial_delay
     while True:
@@ -79,10 +86,19 @@ def stream_response_from_api(query:str, max_retries: int = 5, backoff_factor:int
                 stream = True,
                 timeout = 300
             )
+            if response.status_code == 429:
+                yield "The assistant is busy right now, please try again in a moment."
+                return
             response.raise_for_status()
 
-            # stream text chunks
-            for chunk in response.iter_content(decode_unicode=True):
+            # stream text chunks; queue position markers the API sends while the
+            # question waits for the model may be split across chunks
+            markers = QueueMarkerParser()
+            for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+                chunk, positions = markers.feed(chunk or "")
+                for position in positions:
+                    if on_queue_position:
+                        on_queue_position(position)
                 if chunk:
                     yield chunk
 
@@ -95,6 +111,9 @@ def stream_response_from_api(query:str, max_retries: int = 5, backoff_factor:int
                         pass
                     yield "\n[Generatioin stopped by user]\n"
                     return
+            tail = markers.flush()
+            if tail:
+                yield tail
             return
         except requests.exceptions.ConnectionError:
             attempt+=1
@@ -126,6 +145,8 @@ def initialise_session_state():
         st.session_state.processing_status = "not_started"
     if "cancel_generation" not in st.session_state:
         st.session_state.cancel_generation = False
+    if "chat_session_id" not in st.session_state:
+        st.session_state.chat_session_id = uuid.uuid4().hex
 
 def render_sidebar():
     """Render the sidebar with setup controls"""
@@ -137,12 +158,14 @@ def render_sidebar():
         with col1:
             if st.button(" New chat", use_container_width=True):
                 st.session_state.messages = []
+                st.session_state.chat_session_id = uuid.uuid4().hex
                 st.success("Chat cleared!")
                 st.rerun()
 
         with col2:
             if st.button("Delete All", use_container_width=True):
                 st.session_state.messages = []
+                st.session_state.chat_session_id = uuid.uuid4().hex
                 st.session_state.uploaded_files = []
                 st.session_state.file_urls = []
                 st.session_state.vectorstore = None
@@ -180,16 +203,15 @@ def render_sidebar():
             
             if st.session_state.uploaded_files or st.session_state.file_urls:
                 st.session_state.processing_status = "processing"
-                with st.spinner("Processing documents..."):
-                    try:
-                        indexer = process_and_index()
-                        st.session_state.vectorstore = indexer
-                        st.session_state.processing_status = "completed"
-                        st.session_state.agent = "Ready"
-                    
-                    except Exception as e:
-                        st.error(f"Error: {e}")
-                        st.session_state.processing_status = "error"
+                try:
+                    job_id = process_and_index()
+                    st.session_state.vectorstore = job_id
+                    st.session_state.processing_status = "completed"
+                    st.session_state.agent = "Ready"
+                
+                except Exception as e:
+                    st.error(f"Error: {e}")
+                    st.session_state.processing_status = "error"
             else:
                 st.warning("Please upload files or provide URLs.")
             
@@ -285,7 +307,11 @@ def render_chat():
                 full_response = ""
 
                 # Stream response token by token
-                for token in stream_response_from_api(prompt):
+                def show_queue_position(position):
+                    status_placeholder.markdown(f"**Waiting for the model... (position {position} in queue)**")
+
+                for token in stream_response_from_api(prompt, st.session_state.chat_session_id,
+                                                       on_queue_position=show_queue_position):
                     if st.session_state.get("cancel_generation", False):
                         full_response += "\n[Generation stopped]\n"
                         message_placeholder.markdown(full_response)
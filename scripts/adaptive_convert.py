@@ -0,0 +1,223 @@
+"""
+Adaptive PDF conversion: PyMuPDF's text layer where a page has a usable one, Docling's
+OCR/table pipeline only for the pages that need it, merged into one DoclingDocument.
+
+Profiles trade speed for fidelity:
+  fast      PyMuPDF for every page with a text layer, Docling (OCR only) for scanned pages
+  balanced  like fast, but pages with large tables also go through Docling with table structure
+  full      Docling with OCR and table structure on every page (the old behaviour)
+"""
+import os
+import re
+import logging
+import tempfile
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import fitz  # PyMuPDF
+from docling_core.types.doc import (
+    BoundingBox, DocItemLabel, DoclingDocument, PictureItem, ProvenanceItem, Size, TableItem, TextItem
+)
+
+from app.core.metrics import INGEST_PAGES
+
+_log = logging.getLogger(__name__)
+
+PROFILES = ("fast", "balanced", "full")
+CONVERT_PROFILE = os.getenv('CONVERT_PROFILE', 'balanced')
+
+# a page with less extractable text than this is treated as scanned
+MIN_TEXT_CHARS = 100
+# share of the page covered by detected tables above which the balanced profile uses Docling
+TABLE_AREA_FRACTION = 0.15
+# lines this much larger than the body text are taken as headings
+HEADING_SIZE_RATIO = 1.15
+HEADING_MAX_CHARS = 120
+_NUMBERED_HEADING_RE = re.compile(r"^(\d+(?:\.\d+)*)\.?\s+\S")
+_SECTION_NUMBER_RE = re.compile(r"^\d+(?:\.\d+)*\.?$")
+# text labels Docling items keep when copied; anything else becomes plain text
+_KEPT_TEXT_LABELS = {
+    DocItemLabel.TEXT, DocItemLabel.PARAGRAPH, DocItemLabel.CAPTION, DocItemLabel.FOOTNOTE,
+    DocItemLabel.REFERENCE, DocItemLabel.PAGE_HEADER, DocItemLabel.PAGE_FOOTER,
+}
+
+
+@dataclass
+class PagePlan:
+    page_no: int        # 1-based, as in Docling provenance
+    use_docling: bool
+    reason: str         # text_layer | scanned | tables
+
+
+def _table_fraction(page) -> float:
+    try:
+        tables = page.find_tables().tables
+    except Exception:
+        return 0.0
+    page_area = page.rect.width * page.rect.height or 1.0
+    return sum(fitz.Rect(table.bbox).get_area() for table in tables) / page_area
+
+
+def classify_pages(pdf, profile: str) -> List[PagePlan]:
+    plans = []
+    for index, page in enumerate(pdf):
+        page_no = index + 1
+        if profile == "full":
+            plans.append(PagePlan(page_no, True, "full"))
+        elif len(page.get_text("text").strip()) < MIN_TEXT_CHARS:
+            plans.append(PagePlan(page_no, True, "scanned"))
+        elif profile == "balanced" and _table_fraction(page) >= TABLE_AREA_FRACTION:
+            plans.append(PagePlan(page_no, True, "tables"))
+        else:
+            plans.append(PagePlan(page_no, False, "text_layer"))
+    return plans
+
+
+def _text_blocks(page) -> list:
+    # TEXTFLAGS_TEXT leaves out images, which the default "dict" extraction decodes
+    return [block for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"] if block.get("type") == 0]
+
+
+def _body_font_size(layouts) -> float:
+    sizes = Counter()
+    for blocks in layouts:
+        for block in blocks:
+            for line in block["lines"]:
+                for span in line["spans"]:
+                    sizes[round(span["size"], 1)] += len(span["text"].strip())
+    return sizes.most_common(1)[0][0] if sizes else 10.0
+
+
+def _join_lines(lines: List[str]) -> str:
+    text = ""
+    for line in lines:
+        if text.endswith("-") and line[:1].islower():
+            # re-join words hyphenated across a line break
+            text = text[:-1] + line
+        else:
+            text = f"{text} {line}" if text else line
+    return text
+
+
+def _heading_level(text: str, size: float, bold: bool, alone: bool, body_size: float):
+    """Heading level for a line, or None if it reads as body text"""
+    if (len(text) > HEADING_MAX_CHARS or text.endswith((".", ",", ";", ":"))
+            or sum(char.isalpha() for char in text) < 3):
+        return None
+    numbered = _NUMBERED_HEADING_RE.match(text)
+    # bold text only counts when numbered or on a line of its own, not for bold lead-ins
+    if size >= body_size * HEADING_SIZE_RATIO or (bold and (numbered or alone)):
+        return numbered.group(1).count(".") + 1 if numbered else 1
+    return None
+
+
+def _add_text_layer(doc: DoclingDocument, blocks, page_no: int, body_size: float):
+    """Add a page's text blocks as paragraphs, splitting off lines that look like headings"""
+    def flush(lines, bbox):
+        text = _join_lines(lines)
+        if text:
+            x0, y0, x1, y1 = bbox
+            prov = ProvenanceItem(page_no=page_no, bbox=BoundingBox(l=x0, t=y0, r=x1, b=y1), charspan=(0, len(text)))
+            doc.add_text(label=DocItemLabel.TEXT, text=text, prov=prov)
+
+    for block in blocks:
+        lines = []  # (text, size, bold, bbox)
+        for line in block["lines"]:
+            # whitespace-only spans are often the only space between two words, so they are
+            # kept in the text and only left out of the font size and weight
+            text = "".join(span["text"] for span in line["spans"]).strip()
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if not text:
+                continue
+            size = max(span["size"] for span in spans)
+            bold = all(span["flags"] & fitz.TEXT_FONT_BOLD for span in spans)
+            if lines and _SECTION_NUMBER_RE.match(lines[-1][0]):
+                # a section number laid out as its own line belongs to the title after it
+                number, number_size, number_bold, number_bbox = lines.pop()
+                text, size, bold = f"{number} {text}", max(size, number_size), bold and number_bold
+                line_bbox = fitz.Rect(number_bbox) | fitz.Rect(line["bbox"])
+            else:
+                line_bbox = fitz.Rect(line["bbox"])
+            lines.append((text, size, bold, line_bbox))
+
+        paragraph, paragraph_bbox = [], None
+        for text, size, bold, line_bbox in lines:
+            level = _heading_level(text, size, bold, len(lines) == 1, body_size)
+            if level is None:
+                paragraph.append(text)
+                paragraph_bbox = paragraph_bbox | line_bbox if paragraph_bbox else line_bbox
+                continue
+            flush(paragraph, paragraph_bbox)
+            paragraph, paragraph_bbox = [], None
+            x0, y0, x1, y1 = line_bbox
+            prov = ProvenanceItem(page_no=page_no, bbox=BoundingBox(l=x0, t=y0, r=x1, b=y1), charspan=(0, len(text)))
+            doc.add_heading(text=text, level=min(level, 6), prov=prov)
+        flush(paragraph, paragraph_bbox)
+
+
+def _copy_items(doc: DoclingDocument, items, page_no: int):
+    """Append Docling items converted from a single-page extract, re-numbered to `page_no`"""
+    for item in items:
+        prov = item.prov[0].model_copy(update={"page_no": page_no}) if item.prov else None
+        if isinstance(item, TableItem):
+            doc.add_table(data=item.data, prov=prov)
+        elif isinstance(item, PictureItem):
+            # carries no text for the chunker
+            continue
+        elif isinstance(item, TextItem):
+            if item.label == DocItemLabel.TITLE:
+                doc.add_title(text=item.text, prov=prov)
+            elif item.label == DocItemLabel.SECTION_HEADER:
+                doc.add_heading(text=item.text, level=getattr(item, "level", 1), prov=prov)
+            else:
+                label = item.label if item.label in _KEPT_TEXT_LABELS else DocItemLabel.TEXT
+                doc.add_text(label=label, text=item.text, prov=prov)
+
+
+def convert_adaptive(get_converter: Callable, file_path: str, profile: str = CONVERT_PROFILE) -> DoclingDocument:
+    """
+    Convert a PDF with the given profile. `get_converter` returns the Docling converter
+    and is only called when some page needs it.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown conversion profile '{profile}', expected one of {PROFILES}")
+
+    with fitz.open(file_path) as pdf:
+        plans = classify_pages(pdf, profile)
+        heavy = [plan.page_no for plan in plans if plan.use_docling]
+        INGEST_PAGES.labels(path="docling").inc(len(heavy))
+        INGEST_PAGES.labels(path="text_layer").inc(len(plans) - len(heavy))
+        _log.info(f"{Path(file_path).name}: {len(plans) - len(heavy)} pages from the text layer, "
+                  f"{len(heavy)} through Docling ({Counter(p.reason for p in plans if p.use_docling)})")
+
+        if len(heavy) == len(plans):
+            return get_converter().convert(file_path).document
+
+        items_by_page: Dict[int, list] = {}
+        if heavy:
+            # one Docling run over an extract holding just the pages that need it
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                extract_path = os.path.join(tmp_dir, "pages.pdf")
+                with fitz.open() as extract:
+                    for page_no in heavy:
+                        extract.insert_pdf(pdf, from_page=page_no - 1, to_page=page_no - 1)
+                    extract.save(extract_path)
+                converted = get_converter().convert(extract_path).document
+            for item, _level in converted.iterate_items():
+                if getattr(item, "prov", None):
+                    original_page = heavy[item.prov[0].page_no - 1]
+                    items_by_page.setdefault(original_page, []).append(item)
+
+        layouts = {plan.page_no: _text_blocks(pdf[plan.page_no - 1]) for plan in plans if not plan.use_docling}
+        body_size = _body_font_size(layouts.values())
+        merged = DoclingDocument(name=Path(file_path).stem)
+        for plan in plans:
+            page = pdf[plan.page_no - 1]
+            merged.add_page(page_no=plan.page_no, size=Size(width=page.rect.width, height=page.rect.height))
+            if plan.use_docling:
+                _copy_items(merged, items_by_page.get(plan.page_no, []), plan.page_no)
+            else:
+                _add_text_layer(merged, layouts[plan.page_no], plan.page_no, body_size)
+        return merged
@@ -0,0 +1,64 @@
+"""
+Compare an embedding backend against the PyTorch reference on chunks from the sample papers.
+
+    python -m scripts.check_embedding_backend --backend onnx-int8 --min-cosine 0.98
+"""
+import sys
+import time
+import argparse
+import logging
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+from app.core.embeddings import get_embedding_backend, check_backend_agreement
+
+_log = logging.getLogger(__name__)
+
+PAPERS_DIR = Path(__file__).parent / "../data/arxiv_papers"
+
+
+def sample_texts(limit: int, chunk_words: int = 120):
+    texts = []
+    for pdf_path in sorted(PAPERS_DIR.glob("*.pdf")):
+        with fitz.open(pdf_path) as doc:
+            words = " ".join(page.get_text() for page in doc).split()
+        for i in range(0, len(words), chunk_words):
+            texts.append(" ".join(words[i:i + chunk_words]))
+            if len(texts) >= limit:
+                return texts
+    return texts
+
+
+def throughput(backend, texts, batch_size):
+    start = time.perf_counter()
+    backend.encode(texts, batch_size=batch_size)
+    return len(texts) / (time.perf_counter() - start)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", default="onnx-int8")
+    parser.add_argument("--reference", default="torch")
+    parser.add_argument("--samples", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    args = parser.parse_args()
+
+    texts = sample_texts(args.samples)
+    reference = get_embedding_backend(args.reference)
+    candidate = get_embedding_backend(args.backend)
+
+    report = check_backend_agreement(reference, candidate, texts)
+    report["reference_texts_per_sec"] = throughput(reference, texts, args.batch_size)
+    report["candidate_texts_per_sec"] = throughput(candidate, texts, args.batch_size)
+    _log.info(report)
+
+    if report["min_cosine"] < args.min_cosine:
+        _log.error(f"min cosine {report['min_cosine']:.4f} is below {args.min_cosine}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Content-addressed on-disk cache of Docling conversions.
+
+Entries are keyed on the SHA-256 of the PDF bytes plus a fingerprint of the pipeline
+options, so the same paper uploaded again under any name skips conversion, while a
+change to the options converts it afresh. Each entry is one gzipped DoclingDocument
+JSON file; the least recently used ones are evicted once the cache grows past its
+size limit. Recency is the file mtime, which hits refresh, so several processes can
+share one cache directory.
+"""
+import os
+import gzip
+import json
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+from app.core.metrics import CONVERSION_CACHE_LOOKUPS
+
+_log = logging.getLogger(__name__)
+
+CONVERSION_CACHE = os.getenv('CONVERSION_CACHE', 'true').lower() == 'true'
+CONVERSION_CACHE_DIR = os.getenv('CONVERSION_CACHE_DIR', 'data/conversion_cache')
+CONVERSION_CACHE_MAX_BYTES = int(os.getenv('CONVERSION_CACHE_MAX_BYTES', str(2 * 1024 ** 3)))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def options_fingerprint(pipeline_options, extra: str = "") -> str:
+    """Stable hash of the conversion settings (and Docling version) that shape the output"""
+    try:
+        from importlib.metadata import version
+        docling_version = version("docling")
+    except Exception:
+        docling_version = "unknown"
+    options = pipeline_options.model_dump(mode="json")
+    payload = json.dumps({"options": options, "docling": docling_version, "extra": extra}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class ConversionCache:
+    def __init__(self, fingerprint: str, cache_dir: str = CONVERSION_CACHE_DIR,
+                 max_bytes: int = CONVERSION_CACHE_MAX_BYTES):
+        self.fingerprint = fingerprint
+        self.dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def key(self, file_path: str) -> str:
+        return f"{file_sha256(file_path)}-{self.fingerprint}"
+
+    def _path(self, key: str) -> Path:
+        # fan out over subdirectories so no single directory gets huge
+        return self.dir / key[:2] / f"{key}.json.gz"
+
+    def get(self, key: str):
+        """The cached DoclingDocument for `key`, or None"""
+        from docling_core.types.doc import DoclingDocument
+
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            CONVERSION_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+        except (OSError, ValueError) as e:
+            _log.warning(f"Dropping unreadable conversion cache entry {path}: {e}")
+            path.unlink(missing_ok=True)
+            CONVERSION_CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+        CONVERSION_CACHE_LOOKUPS.labels(result="hit").inc()
+        return DoclingDocument.model_validate(data)
+
+    def put(self, key: str, doc):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=5) as f:
+                json.dump(doc.export_to_dict(), f)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            _log.warning(f"Could not cache conversion {key}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+        self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            for path in self.dir.glob("*/*.json.gz"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+
+    def stats(self) -> dict:
+        sizes = [path.stat().st_size for path in self.dir.glob("*/*.json.gz")]
+        return {"entries": len(sizes), "bytes": sum(sizes), "max_bytes": self.max_bytes}
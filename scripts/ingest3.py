@@ -1,13 +1,20 @@
 import logging
 import time
 from pathlib import Path
-from typing import List, Any
+from typing import List, Any, Optional
+from dataclasses import dataclass, field
 import tempfile
 import os
 from io import BytesIO
 import uuid
-from sentence_transformers import SentenceTransformer
+import json
+import hashlib
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import itertools
 import requests
+from requests.adapters import HTTPAdapter
 
 
 from docling_core.types.doc import ImageRefMode, PictureItem, TableItem
@@ -19,48 +26,296 @@ from docling_core.transforms.chunker import HierarchicalChunker
 from docling_core.transforms.chunker.hybrid_chunker import HybridChunker
 from docling_core.transforms.chunker.tokenizer.base import BaseTokenizer
 from docling_core.transforms.chunker.tokenizer.huggingface import HuggingFaceTokenizer
-from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance, PointStruct
+from app.core.collection_version import bump_collection_version
+from app.core.embeddings import get_embedding_backend
+from app.core.vector_store import get_vector_store, VECTOR_STORE, QDRANT_HOST, QDRANT_PORT
+from app.core.sparse_index import BM25Index
+from app.core.metrics import INGEST_DOCUMENTS, INGEST_CHUNKS, INGEST_STAGE_SECONDS
+from scripts.conversion_cache import ConversionCache, options_fingerprint, CONVERSION_CACHE
+from scripts.ingest_manifest import IngestManifest
+from scripts.adaptive_convert import convert_adaptive, CONVERT_PROFILE, PROFILES
 
 _log = logging.getLogger(__name__)
 
 IMAGE_RESOLUTION_SCALE = 2.0
-EMBEDDING_MODEL = 'sentence-transformers/all-MiniLM-L6-v2'
 COLLECTION = "papers"
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', '64'))
+UPSERT_BATCH_SIZE = int(os.getenv('UPSERT_BATCH_SIZE', '256'))
+UPSERT_WAIT = os.getenv('UPSERT_WAIT', 'true').lower() == 'true'
+MAX_INFLIGHT_UPSERTS = int(os.getenv('MAX_INFLIGHT_UPSERTS', '2'))
+CONVERT_WORKERS = int(os.getenv('CONVERT_WORKERS', '1'))
+DOWNLOAD_CONCURRENCY = int(os.getenv('DOWNLOAD_CONCURRENCY', '8'))
+DOWNLOAD_MAX_BYTES = int(os.getenv('DOWNLOAD_MAX_BYTES', str(100 * 1024 * 1024)))
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+DOWNLOAD_TIMEOUT = 30
+PDF_MAGIC = b"%PDF-"
+
+# fixed namespace so the same chunk always maps to the same point id
+CHUNK_ID_NAMESPACE = uuid.UUID("6f1c2a4e-9b1d-4c8e-a3f0-5d7e2b9c8a11")
+
+
+def sha256_hex(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def chunk_point_id(source_hash: str, section_path: List[str], text: str) -> str:
+    """Deterministic point id from the document, its section path and the chunk text"""
+    content_hash = sha256_hex("\x1f".join([source_hash, " > ".join(section_path), text]))
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, content_hash))
+
+
+def document_hash(doc_obj) -> str:
+    """Hash of the document contents, used to detect unchanged re-uploads"""
+    origin = getattr(doc_obj, "origin", None)
+    if origin is not None and getattr(origin, "binary_hash", None) is not None:
+        return str(origin.binary_hash)
+    return sha256_hex(doc_obj.export_to_markdown())
+
+
+class UnsupportedContentError(Exception):
+    """Raised when a URL does not point to a PDF"""
+
+
+class DownloadTooLargeError(Exception):
+    """Raised when a download exceeds DOWNLOAD_MAX_BYTES"""
+
+
+def make_download_session(pool_size: int = DOWNLOAD_CONCURRENCY) -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def download_to_file(session: requests.Session, url: str, dest_dir: str, index: int = 0,
+                     max_bytes: int = DOWNLOAD_MAX_BYTES) -> tuple[str, str]:
+    """
+    Stream a PDF from `url` into `dest_dir` chunk by chunk and return (file_path, filename).
+
+    The content type is checked from the headers and the first bytes before the rest of
+    the body is read, and the download is aborted once it passes `max_bytes`.
+    """
+    filename = url.split('/')[-1] or "document"
+    with session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        response.raise_for_status()
+
+        content_length = int(response.headers.get('content-length') or 0)
+        if content_length > max_bytes:
+            raise DownloadTooLargeError(f"{content_length} bytes exceeds limit of {max_bytes}")
+
+        chunks = response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)
+        first_chunk = next(chunks, b"")
+        declared_pdf = url.lower().endswith('.pdf') or 'application/pdf' in response.headers.get('content-type', '')
+        if not first_chunk.startswith(PDF_MAGIC):
+            content_type = response.headers.get('content-type', 'unknown')
+            if not declared_pdf or first_chunk[:1] == b"<":
+                raise UnsupportedContentError(f"content-type {content_type}")
+
+        file_path = os.path.join(dest_dir, f"{index}-{filename}")
+        written = 0
+        try:
+            with open(file_path, "wb") as f:
+                for chunk in itertools.chain([first_chunk], chunks):
+                    written += len(chunk)
+                    if written > max_bytes:
+                        raise DownloadTooLargeError(f"download exceeds limit of {max_bytes} bytes")
+                    f.write(chunk)
+        except Exception:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+
+    return file_path, filename
+
+
+def _build_converter(pipeline_options: PdfPipelineOptions) -> DocumentConverter:
+    return DocumentConverter(
+        format_options={
+            InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options)
+        }
+    )
+
+
+def pipeline_options_for(profile: str) -> PdfPipelineOptions:
+    """Docling settings for the pages a profile sends through Docling"""
+    pipeline_options = PdfPipelineOptions()
+    pipeline_options.do_ocr = True
+    # the fast profile only sends scanned pages to Docling, for OCR
+    pipeline_options.do_table_structure = profile != "fast"
+    # picture images are never chunked; only the full profile keeps producing them
+    pipeline_options.generate_picture_images = profile == "full"
+    pipeline_options.images_scale = IMAGE_RESOLUTION_SCALE
+    return pipeline_options
+
+
+# settings of a conversion worker process, set by _init_convert_worker; the converter
+# itself is built on first use, since the adaptive profiles may never need it
+_worker_options = None
+_worker_profile = CONVERT_PROFILE
+_worker_converter = None
+
+
+def _init_convert_worker(pipeline_options: PdfPipelineOptions, profile: str = CONVERT_PROFILE):
+    global _worker_options, _worker_profile
+    _worker_options = pipeline_options
+    _worker_profile = profile
+
+
+def _get_worker_converter() -> DocumentConverter:
+    global _worker_converter
+    if _worker_converter is None:
+        _worker_converter = _build_converter(_worker_options)
+    return _worker_converter
+
+
+def _convert_file(get_converter, file_path: str, filename: str, profile: str = CONVERT_PROFILE) -> dict:
+    if profile == "full":
+        document = get_converter().convert(file_path).document
+    else:
+        document = convert_adaptive(get_converter, file_path, profile)
+    return {
+        'markdown': document.export_to_markdown(),
+        'doc': document,
+        'filename': filename
+    }
+
+
+def _convert_in_worker(file_path: str, filename: str) -> dict:
+    return _convert_file(_get_worker_converter, file_path, filename, _worker_profile)
 
 
 class DocumentProcessor:
-    def __init__(self):
-        # Configure pipeline options for PDF processing
-        self.pipeline_options = PdfPipelineOptions()
-        self.pipeline_options.do_ocr = True
-        self.pipeline_options.do_table_structure = True
-        self.pipeline_options.generate_picture_images = True
-        self.pipeline_options.images_scale = IMAGE_RESOLUTION_SCALE
-        
-        # Initialize converter once in __init__
-        self.converter = DocumentConverter(
-            format_options={
-                InputFormat.PDF: PdfFormatOption(pipeline_options=self.pipeline_options)
-            }
-        )
-        
+    def __init__(self, parallel_workers: int = CONVERT_WORKERS,
+                 download_concurrency: int = DOWNLOAD_CONCURRENCY,
+                 use_cache: bool = CONVERSION_CACHE, profile: str = CONVERT_PROFILE):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown conversion profile '{profile}', expected one of {PROFILES}")
+        # fast/balanced take text from the PDF's own text layer and only send scanned or
+        # table-heavy pages through Docling; full converts every page with Docling
+        self.profile = profile
+        self.pipeline_options = pipeline_options_for(profile)
+
+        # With more than one worker, conversion runs in a process pool where each
+        # worker builds its own converter; otherwise one converter is kept here.
+        self.parallel_workers = max(1, parallel_workers)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._local_lock = threading.Lock()
+        self.download_concurrency = max(1, download_concurrency)
+        self._session = None
+        self._session_lock = threading.Lock()
+        # built on first use, so documents served from the cache never load Docling's models
+        self.converter = None
+        self.cache = ConversionCache(options_fingerprint(self.pipeline_options, extra=profile)) if use_cache else None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.parallel_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_convert_worker,
+                    initargs=(self.pipeline_options, self.profile)
+                )
+            return self._pool
+
+    @property
+    def session(self) -> requests.Session:
+        """Pooled HTTP session for downloads, created on first use; safe to call from several threads"""
+        with self._session_lock:
+            if self._session is None:
+                self._session = make_download_session(self.download_concurrency)
+            return self._session
+
+    def close(self):
+        """Shut down the conversion worker pool and download session, if started"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def _cached(self, file_path: str, filename: str):
+        """(cache key, converted result if cached); the key is None when caching is off"""
+        if self.cache is None:
+            return None, None
+        key = self.cache.key(file_path)
+        doc = self.cache.get(key)
+        if doc is None:
+            return key, None
+        return key, {'markdown': doc.export_to_markdown(), 'doc': doc, 'filename': filename}
+
+    def _store(self, key, result: dict) -> dict:
+        if key is not None:
+            self.cache.put(key, result['doc'])
+        return result
+
+    def convert_files(self, files):
+        """
+        Convert (file_path, filename) pairs, yielding (filename, result, error) as each
+        conversion finishes. Exactly one of result and error is None. Files already in
+        the conversion cache are yielded first without being converted.
+        """
+        pending = []
+        for file_path, filename in files:
+            try:
+                key, cached = self._cached(file_path, filename)
+            except Exception as e:
+                yield filename, None, e
+                continue
+            if cached is not None:
+                yield filename, cached, None
+            else:
+                pending.append((file_path, filename, key))
+
+        if self.parallel_workers == 1 or len(pending) < 2:
+            for file_path, filename, key in pending:
+                try:
+                    yield filename, self._store(key, self._convert_local(file_path, filename)), None
+                except Exception as e:
+                    yield filename, None, e
+            return
+
+        pool = self._get_pool()
+        futures = {
+            pool.submit(_convert_in_worker, file_path, filename): (filename, key)
+            for file_path, filename, key in pending
+        }
+        for future in as_completed(futures):
+            filename, key = futures[future]
+            try:
+                yield filename, self._store(key, future.result()), None
+            except Exception as e:
+                yield filename, None, e
+
+    def convert_one(self, file_path: str, filename: str) -> dict:
+        """Convert one file, in the worker pool when there is one; safe to call from several threads"""
+        key, cached = self._cached(file_path, filename)
+        if cached is not None:
+            return cached
+        if self.parallel_workers == 1:
+            with self._local_lock:
+                return self._store(key, self._convert_local(file_path, filename))
+        return self._store(key, self._get_pool().submit(_convert_in_worker, file_path, filename).result())
+
+    def _get_converter(self) -> DocumentConverter:
+        if self.converter is None:
+            self.converter = _build_converter(self.pipeline_options)
+        return self.converter
+
+    def _convert_local(self, file_path: str, filename: str) -> dict:
+        return _convert_file(self._get_converter, file_path, filename, self.profile)
         
     def process_pdf(self, file_bytes: BytesIO, filename:str) -> dict:
         temp_dir = tempfile.mkdtemp()
         try:
             temp_file_path = os.path.join(temp_dir, filename)
             with open(temp_file_path, "wb") as f:
-                f.write(file_bytes.getvalue())
-
-            result = self.converter.convert(temp_file_path)
-            markdown_content = result.document.export_to_markdown()
+                f.write(file_bytes.getbuffer())
 
-            return {
-                'markdown': markdown_content,
-                'doc': result.document,
-                'filename': filename
-            }
+            return self.convert_one(temp_file_path, filename)
         
         except Exception as e:
             _log.error(f"Error processing PDF {filename}: {str(e)}")
@@ -75,40 +330,51 @@ class DocumentProcessor:
     def process_urls(self, urls):
         markdown_results = ""
         docs = []
+        temp_dir = tempfile.mkdtemp()
+        downloaded = []
 
-        for url in urls:
+        try:
+            session = self.session
+            with ThreadPoolExecutor(max_workers=self.download_concurrency) as download_pool:
+                futures = {
+                    download_pool.submit(download_to_file, session, url, temp_dir, i): url
+                    for i, url in enumerate(urls)
+                }
+                for future in as_completed(futures):
+                    url = futures[future]
+                    try:
+                        downloaded.append(future.result())
+                    except UnsupportedContentError as e:
+                        _log.warning(f"unsupported file type for URL: {url} ({str(e)})")
+                    except requests.exceptions.Timeout:
+                        error_msg = f"Timeout downloading {url}"
+                        _log.error(error_msg)
+                        markdown_results += f"\n\n**Error:** {error_msg}"
+                    except requests.exceptions.ConnectionError as e:
+                        error_msg = f"Connection error downloading {url}: {str(e)}"
+                        _log.error(error_msg)
+                        markdown_results += f"\n\n**Error:** {error_msg}"
+                    except Exception as e:
+                        error_msg = f"Error processing URL {url}: {str(e)}"
+                        _log.error(error_msg)
+                        markdown_results += f"\n\n**Error:** {error_msg}"
+
+            for filename, doc, error in self.convert_files(downloaded):
+                if error is not None:
+                    error_msg = f"Error processing PDF {filename}: {str(error)}"
+                    _log.error(error_msg)
+                    markdown_results += f"\n\n**Error:** {error_msg}"
+                    continue
+                markdown_results +=f"\n\n## {filename}\n{doc['markdown']}"
+                docs.append(doc)
+                _log.info(f"successfully processed PDF: {filename}")
+
+        finally:
             try:
-                response = requests.get(url, timeout = 30)
-                response.raise_for_status()
-
-                filename = url.split('/')[-1] or "document"
-
-                if url.lower().endswith('.pdf') or 'application/pdf' in response.headers.get('content-type', ''):
-                    file_bytes = BytesIO(response.content)
-                    doc = self.process_pdf(file_bytes, filename)
-                    markdown_results +=f"\n\n## {filename}\n{doc['markdown']}"
-                    docs.append({
-                        'markdown':doc['markdown'],
-                        'doc':doc['doc'],
-                        'filename':filename
-                    })
-                    _log.info(f"successfully processed PDF from URI: {url}")
-                
-                else:
-                    _log.warning(f"unsupported file type for URL: {url}")
-                
-            except requests.exceptions.Timeout:
-                error_msg = f"Timeout downloading {url}"
-                _log.error(error_msg)
-                markdown_results += f"\n\n**Error:** {error_msg}"
-            except requests.exceptions.ConnectionError as e:
-                error_msg = f"Connection error downloading {url}: {str(e)}"
-                _log.error(error_msg)
-                markdown_results += f"\n\n**Error:** {error_msg}"
+                import shutil
+                shutil.rmtree(temp_dir)
             except Exception as e:
-                error_msg = f"Error processing URL {url}: {str(e)}"
-                _log.error(error_msg)
-                markdown_results += f"\n\n**Error:** {error_msg}"
+                _log.warning(f"Could not clean up temp directory: {str(e)}")
         
         return markdown_results, docs
 
@@ -128,6 +394,7 @@ class DocumentProcessor:
         temp_dir = tempfile.mkdtemp()
 
         try:
+            saved_files = []
             for uploaded_file in uploaded_files:
                 _log.info(f"Processing {uploaded_file.name}...")
 
@@ -135,28 +402,19 @@ class DocumentProcessor:
                 temp_file_path = os.path.join(temp_dir, uploaded_file.name)
                 with open(temp_file_path, "wb") as f:
                     f.write(uploaded_file.getbuffer())
+                saved_files.append((temp_file_path, uploaded_file.name))
 
-                # Process the document with Docling
-                try:
-                    result = self.converter.convert(temp_file_path)
-
-                    # Export to markdown
-                    markdown_content = result.document.export_to_markdown()
-                    markdown_contents.append(markdown_content)
-
-                    # Store the Docling document for structure and indexing
-                    docling_docs.append({
-                        'filename': uploaded_file.name,
-                        'doc': result.document,
-                        'markdown': markdown_content
-                    })
-
-                    _log.info(f"Successfully processed {uploaded_file.name}")
-
-                except Exception as e:
-                    _log.error(f"Error processing {uploaded_file.name}: {str(e)}")
+            # Process the documents with Docling, in completion order
+            for filename, doc, error in self.convert_files(saved_files):
+                if error is not None:
+                    _log.error(f"Error processing {filename}: {str(error)}")
                     continue
 
+                markdown_contents.append(doc['markdown'])
+                # Store the Docling document for structure and indexing
+                docling_docs.append(doc)
+                _log.info(f"Successfully processed {filename}")
+
         finally:
             # Clean up temporary files
             try:
@@ -169,58 +427,95 @@ class DocumentProcessor:
         return "\n".join(markdown_contents), docling_docs
 
 
+@dataclass
+class PreparedDocument:
+    """A chunked document waiting to be embedded and written"""
+    source_name: str
+    doc_hash: str
+    point_ids: List[str] = field(default_factory=list)   # every chunk of the document, in order
+    new_ids: List[str] = field(default_factory=list)     # chunks not stored yet
+    texts: List[str] = field(default_factory=list)       # text to embed, per new chunk
+    payloads: List[dict] = field(default_factory=list)   # payload, per new chunk
+    replaces: Optional[str] = None                        # hash of the earlier version this is a revision of
+    vectors: Any = None                                   # embeddings of `texts`, once computed
+
+
 class QdrantIndexer:
-    def __init__(self, collection_name: str, host="localhost", port=6333):
+    """
+    Chunks, embeds and stores documents in a collection. Despite the name the
+    storage backend is whatever VECTOR_STORE selects (Qdrant by default).
+    """
+
+    def __init__(self, collection_name: str, host=QDRANT_HOST, port=QDRANT_PORT,
+                 embed_batch_size: int = EMBED_BATCH_SIZE,
+                 upsert_batch_size: int = UPSERT_BATCH_SIZE,
+                 upsert_wait: bool = UPSERT_WAIT,
+                 max_inflight_upserts: int = MAX_INFLIGHT_UPSERTS,
+                 embedder=None, store=None, sparse_index=None):
         self.collection_name = collection_name
-        self.client = QdrantClient(host=host, port=port)
-        self.embedder = SentenceTransformer(EMBEDDING_MODEL)
-        self.emb_dim = self.embedder.get_sentence_embedding_dimension()
+        self.embed_batch_size = embed_batch_size
+        self.upsert_batch_size = upsert_batch_size
+        self.upsert_wait = upsert_wait
+        self.max_inflight_upserts = max(1, max_inflight_upserts)
+        if store is None:
+            store_kwargs = {"host": host, "port": port} if VECTOR_STORE == "qdrant" else {}
+            store = get_vector_store(collection_name, **store_kwargs)
+        self.store = store
+        self.embedder = embedder or get_embedding_backend()
+        self.emb_dim = self.embedder.dimension
+        self.manifest = IngestManifest(collection_name)
+        # lexical index kept in sync with the vector store for hybrid retrieval; the
+        # API server passes the retriever's, so searches see new chunks without a reload
+        self.sparse_index = sparse_index if sparse_index is not None else BM25Index(collection_name)
+        self._commit_lock = threading.Lock()
         
         # Create collection if not exists
-        if not self.client.collection_exists(collection_name):
-            self.client.create_collection(
-                collection_name=collection_name,
-                vectors_config=VectorParams(
-                    size=self.emb_dim,
-                    distance=Distance.COSINE
-                )
-            )
+        if self.store.ensure_collection(self.emb_dim):
+            # a fresh collection holds none of the manifest's points
+            self.manifest.clear()
+            self.sparse_index.clear()
+            self.sparse_index.save()
             _log.info(f"Created collection: {collection_name}")
     
     def clear_collection(self):
         """Delete and recreate the collection to remove old data"""
 
-        try:
-            self.client.delete_collection(collection_name=self.collection_name)
-            _log.info(f"Cleared collection: {self.collection_name}")
-        except Exception as e:
-            _log.warning(f"Could not delete collection: {str(e)}")
-
-        
-        # recreate empty collection
-
-        self.client.create_collection(
-            collection_name=self.collection_name,
-            vectors_config=VectorParams(
-                size=self.emb_dim,
-                distance=Distance.COSINE
-            )
-        )
+        self.store.recreate_collection(self.emb_dim)
         _log.info(f"Recreated collection: {self.collection_name}")
+        self.manifest.clear()
+        self.sparse_index.clear()
+        self.sparse_index.save()
+        bump_collection_version(self.collection_name)
 
 
-    def index_document(self, doc_obj, source_name="document"):
+    def _upsert_points(self, points):
+        ids, vectors, payloads = zip(*points)
+        with INGEST_STAGE_SECONDS.labels(stage="upsert").time():
+            self.store.upsert(list(ids), list(vectors), list(payloads), wait=self.upsert_wait)
+        INGEST_CHUNKS.labels(operation="upserted").inc(len(ids))
+
+    def prepare_document(self, doc_obj, source_name="document") -> Optional[PreparedDocument]:
         """
-        Index a Docling using HierarchicalChunker
+        Chunk a Docling document with HierarchicalChunker and work out which chunks are
+        new and which indexed document, if any, it is a revision of. Returns None if the
+        document is unchanged.
         """
-        points = []
+        doc_hash = document_hash(doc_obj)
+        if self.manifest.get(doc_hash):
+            _log.info(f"Skipping unchanged document: {source_name}")
+            INGEST_DOCUMENTS.labels(result="unchanged").inc()
+            return None
+        stored_ids = self.manifest.referenced_ids()
+
         chunker = HierarchicalChunker(
             max_tokens = 500,
             overlap = 50
         )
-        chunks = list(chunker.chunk(doc_obj))
-    
-        for chunk in chunks:
+
+        source_hash = sha256_hex(source_name)
+        prepared = PreparedDocument(source_name=source_name, doc_hash=doc_hash)
+        chunk_started = time.perf_counter()
+        for chunk in chunker.chunk(doc_obj):
             text = chunk.text.strip()
 
             # skip very small chunks
@@ -228,53 +523,126 @@ class QdrantIndexer:
                 continue
 
             section_path = chunk.meta.headings or []
-            enriched_text = " > ".join(section_path) + "\n\n" + text
-            vector = self.embedder.encode(enriched_text).tolist()
+            point_id = chunk_point_id(source_hash, section_path, text)
+            if point_id in stored_ids or point_id in prepared.point_ids:
+                prepared.point_ids.append(point_id)
+                continue
 
-            payload = {
+            prepared.point_ids.append(point_id)
+            prepared.new_ids.append(point_id)
+            prepared.texts.append(" > ".join(section_path) + "\n\n" + text)
+            prepared.payloads.append({
                 "type": "text",
                 "content": text,
                 "section_path": section_path,
                 "source_name": source_name
-            }
+            })
+
+        INGEST_STAGE_SECONDS.labels(stage="chunk").observe(time.perf_counter() - chunk_started)
+        prepared.replaces = self.manifest.predecessor(source_name, prepared.point_ids)
+        return prepared
+
+    def embed_document(self, prepared: PreparedDocument):
+        """Embed all new chunks of a prepared document up front"""
+        if prepared.texts:
+            with INGEST_STAGE_SECONDS.labels(stage="embed").time():
+                prepared.vectors = self.embedder.encode(prepared.texts, batch_size=self.embed_batch_size)
+
+    def _embedded_points(self, prepared: PreparedDocument):
+        """(id, vector, payload) for each new chunk, embedding a batch at a time unless already embedded"""
+        for start in range(0, len(prepared.texts), self.embed_batch_size):
+            end = start + self.embed_batch_size
+            if prepared.vectors is not None:
+                vectors = prepared.vectors[start:end]
+            else:
+                with INGEST_STAGE_SECONDS.labels(stage="embed").time():
+                    vectors = self.embedder.encode(prepared.texts[start:end], batch_size=self.embed_batch_size)
+            yield from zip(prepared.new_ids[start:end], vectors, prepared.payloads[start:end])
+
+    def write_document(self, prepared: PreparedDocument) -> int:
+        """
+        Upsert the new chunks of a prepared document, delete its stale ones and record
+        it in the manifest and the sparse index. Returns the number of chunks written.
 
-            points.append(
-                PointStruct(
-                    id = int(uuid.uuid4().int % (2**32)),
-                    vector = vector,
-                    payload=payload
-                )
-            )
+        Points are upserted in batches of `upsert_batch_size`; up to `max_inflight_upserts`
+        upserts run in the background while the next batch is being embedded.
+        """
+        pending = []
+        batch = []
+        with ThreadPoolExecutor(max_workers=self.max_inflight_upserts) as upsert_pool:
+            for point in self._embedded_points(prepared):
+                batch.append(point)
+                if len(batch) >= self.upsert_batch_size:
+                    # bound the number of upserts in flight before queueing another
+                    if len(pending) >= self.max_inflight_upserts:
+                        pending.pop(0).result()
+                    pending.append(upsert_pool.submit(self._upsert_points, batch))
+                    batch = []
+
+            if batch:
+                pending.append(upsert_pool.submit(self._upsert_points, batch))
+            for future in pending:
+                future.result()
+
+        # manifest and sparse index are shared by every document being written
+        with self._commit_lock:
+            point_ids = list(dict.fromkeys(prepared.point_ids))
+            stale_ids = []
+            if prepared.replaces is not None:
+                # chunks of the earlier version that neither this one nor any other document uses
+                previous_ids = set(self.manifest.get(prepared.replaces).get("point_ids", []))
+                in_use = set(point_ids) | self.manifest.referenced_ids(exclude=prepared.replaces)
+                stale_ids = sorted(previous_ids - in_use)
+            if stale_ids:
+                self.store.delete(stale_ids, wait=self.upsert_wait)
+                INGEST_CHUNKS.labels(operation="deleted").inc(len(stale_ids))
+
+            changed = bool(prepared.texts or stale_ids)
+            if changed:
+                for point_id in stale_ids:
+                    self.sparse_index.remove(point_id)
+                for point_id, text in zip(prepared.new_ids, prepared.texts):
+                    self.sparse_index.add(point_id, text)
+                self.sparse_index.save()
+
+            self.manifest.set(prepared.doc_hash, prepared.source_name, point_ids, replaces=prepared.replaces)
+        INGEST_DOCUMENTS.labels(result="indexed").inc()
+        if changed:
+            bump_collection_version(self.collection_name)
+        _log.info(f"Indexed {len(prepared.texts)} new chunks and removed {len(stale_ids)} stale chunks "
+                  f"from {prepared.source_name}")
+
+        return len(prepared.texts)
+
+    def index_document(self, doc_obj, source_name="document"):
+        """
+        Index a Docling using HierarchicalChunker
+
+        Point ids are derived from the source, section path and chunk text, so re-indexing
+        an unchanged document is a no-op and a revised one only upserts new chunks and
+        deletes the ones that disappeared. A different document uploaded under a name
+        that is already indexed is added alongside it (see scripts.ingest_manifest).
+
+        Chunks are embedded `embed_batch_size` at a time and upserted in batches of
+        `upsert_batch_size`, overlapping embedding with the upserts (see write_document).
+        """
+        prepared = self.prepare_document(doc_obj, source_name)
+        if prepared is None:
+            return 0
+        return self.write_document(prepared)
 
-        if points:
-            self.client.upsert(
-                collection_name=self.collection_name,
-                points = points
-            )
-            _log.info(f"Indexed {len(points)} chunks from {source_name}")
-            
-        return len(points)
-        
     def retrieve(self, query: str, limit: int = 5, filter_type: str = None) -> List[dict]:
         """Retrieve relevant documents based on semantic similarity"""
-        query_vec = self.embedder.encode(query).tolist()
+        query_vec = self.embedder.encode_one(query).tolist()
 
         try:
-            # Use query_points (available in your qdrant-client version)
-            results = self.client.query_points(
-                collection_name=self.collection_name,
-                query=query_vec,
-                limit=limit,
-                with_payload=True
-            )
-
             # Normalize results
             retrieved = []
-            for r in results.points:
+            for hit in self.store.search(query_vec, limit):
                 retrieved.append({
-                    "id": r.id,
-                    "payload": r.payload or {},
-                    "score": r.score
+                    "id": hit.id,
+                    "payload": hit.payload,
+                    "score": hit.score
                 })
             return retrieved
 
@@ -0,0 +1,85 @@
+"""
+Per-collection record of the ingested documents, used to skip unchanged re-uploads
+and to find the chunks a revised document no longer has.
+
+Entries are keyed on the document hash, so two different papers uploaded under the
+same file name are two entries and never replace each other. A new upload only
+replaces an earlier entry when it is a revision of it: same source name, and it
+keeps at least REVISION_MIN_SHARED of the earlier version's chunks.
+"""
+import os
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Set
+
+_log = logging.getLogger(__name__)
+
+MANIFEST_DIR = os.getenv('MANIFEST_DIR', 'data/manifests')
+# share of an indexed document's chunks a new upload under the same name must keep to
+# count as its revision rather than a different paper that happens to share the name
+REVISION_MIN_SHARED = float(os.getenv('REVISION_MIN_SHARED', '0.5'))
+
+
+class IngestManifest:
+    """document hash -> {"source_name", "point_ids"} for one collection, saved as JSON; thread-safe"""
+
+    def __init__(self, collection_name: str, manifest_dir: str = MANIFEST_DIR):
+        self.path = Path(manifest_dir) / f"{collection_name}.json"
+        self.entries = {}
+        self._lock = threading.RLock()
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding="utf-8"))
+            except json.JSONDecodeError:
+                _log.warning(f"Ignoring unreadable manifest: {self.path}")
+
+    def get(self, doc_hash: str) -> dict:
+        with self._lock:
+            return self.entries.get(doc_hash, {})
+
+    def set(self, doc_hash: str, source_name: str, point_ids: List[str], replaces: Optional[str] = None):
+        """Record a document, dropping the entry of the earlier version it `replaces`"""
+        with self._lock:
+            if replaces is not None:
+                self.entries.pop(replaces, None)
+            self.entries[doc_hash] = {"source_name": source_name, "point_ids": sorted(set(point_ids))}
+            self.save()
+
+    def referenced_ids(self, exclude: Optional[str] = None) -> Set[str]:
+        """Point ids recorded for any document but `exclude`"""
+        with self._lock:
+            return {
+                point_id
+                for doc_hash, entry in self.entries.items() if doc_hash != exclude
+                for point_id in entry.get("point_ids", [])
+            }
+
+    def predecessor(self, source_name: str, point_ids: Iterable[str],
+                    min_shared: float = REVISION_MIN_SHARED) -> Optional[str]:
+        """Hash of the document that `point_ids`, uploaded as `source_name`, is a revision of, if any"""
+        new_ids = set(point_ids)
+        best, best_shared = None, 0.0
+        with self._lock:
+            entries = list(self.entries.items())
+        for doc_hash, entry in entries:
+            ids = entry.get("point_ids") or []
+            if entry.get("source_name") != source_name or not ids:
+                continue
+            shared = len(new_ids.intersection(ids)) / len(ids)
+            if shared >= min_shared and shared > best_shared:
+                best, best_shared = doc_hash, shared
+        return best
+
+    def clear(self):
+        with self._lock:
+            self.entries = {}
+            self.save()
+
+    def save(self):
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".json.tmp")
+            tmp_path.write_text(json.dumps(self.entries), encoding="utf-8")
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,252 @@
+"""
+Streaming ingestion: fetch -> convert -> chunk -> embed -> upsert, one thread pool per
+stage, connected by bounded queues.
+
+Each document moves through the stages on its own, so downloads, Docling conversion,
+embedding and vector store writes of different documents overlap, and at most a few
+converted documents are held in memory at any time however large the batch is.
+"""
+import os
+import queue
+import shutil
+import logging
+import tempfile
+import itertools
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from scripts.ingest3 import DocumentProcessor, QdrantIndexer, download_to_file
+
+_log = logging.getLogger(__name__)
+
+# documents allowed to wait between two stages; bounds memory for large batches
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '2'))
+CHUNK_WORKERS = int(os.getenv('CHUNK_WORKERS', '1'))
+EMBED_WORKERS = int(os.getenv('EMBED_WORKERS', '1'))
+UPSERT_WORKERS = int(os.getenv('UPSERT_WORKERS', '1'))
+
+STAGES = ("fetch", "convert", "chunk", "embed", "upsert")
+
+_DONE = object()
+
+
+@dataclass
+class IngestSource:
+    """One document to ingest: a local `path` or a `url`"""
+    name: str
+    url: Optional[str] = None
+    path: Optional[str] = None
+
+
+@dataclass
+class IngestEvent:
+    """Progress of one document: `status` is started, done, skipped or failed at `stage`"""
+    source: str
+    stage: str
+    status: str
+    detail: str = ""
+    chunks: int = 0
+    index: int = 0  # position of the source in the run; names need not be unique
+
+    @property
+    def finished(self) -> bool:
+        """Whether this is the last event for its document"""
+        return self.status in ("failed", "skipped") or (self.stage == "upsert" and self.status == "done")
+
+
+@dataclass
+class _Item:
+    source: IngestSource
+    index: int
+    value: Any = None
+    temp_file: Optional[str] = None
+
+    def event(self, stage: str, status: str, **kwargs) -> IngestEvent:
+        return IngestEvent(self.source.name, stage, status, index=self.index, **kwargs)
+
+
+class IngestPipeline:
+    """
+    Runs documents through the ingestion stages concurrently.
+
+        pipeline = IngestPipeline(processor, indexer)
+        for event in pipeline.run(sources):
+            ...
+
+    Stage concurrency: fetch uses the processor's download concurrency, convert its
+    number of conversion workers; chunk, embed and upsert default to one worker each
+    (CHUNK_WORKERS, EMBED_WORKERS, UPSERT_WORKERS).
+    """
+
+    def __init__(self, processor: DocumentProcessor, indexer: QdrantIndexer,
+                 queue_size: int = PIPELINE_QUEUE_SIZE, fetch_workers: Optional[int] = None,
+                 convert_workers: Optional[int] = None, chunk_workers: int = CHUNK_WORKERS,
+                 embed_workers: int = EMBED_WORKERS, upsert_workers: int = UPSERT_WORKERS):
+        self.processor = processor
+        self.indexer = indexer
+        self.queue_size = max(1, queue_size)
+        self.workers = {
+            "fetch": fetch_workers or processor.download_concurrency,
+            "convert": convert_workers or processor.parallel_workers,
+            "chunk": max(1, chunk_workers),
+            "embed": max(1, embed_workers),
+            "upsert": max(1, upsert_workers),
+        }
+        self._stop = threading.Event()
+        self._temp_dir = None
+        self._file_numbers = itertools.count()
+
+    # -- plumbing ----------------------------------------------------------
+
+    def _put(self, q: queue.Queue, item) -> bool:
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _start_stage(self, name: str, work: Callable[[_Item], Optional[_Item]],
+                     inbox: queue.Queue, outbox: queue.Queue, events: queue.Queue):
+        remaining = [self.workers[name]]
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                item = self._get(inbox)
+                if item is _DONE:
+                    # let the other workers of this stage see the end too
+                    self._put(inbox, _DONE)
+                    break
+                try:
+                    result = work(item)
+                except Exception as e:
+                    _log.error(f"{name} failed for {item.source.name}: {e}")
+                    events.put(item.event(name, "failed", detail=str(e)))
+                    self._cleanup(item)
+                    continue
+                if result is not None and not self._put(outbox, result):
+                    break
+            with lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                self._put(outbox, _DONE)
+
+        threads = [
+            threading.Thread(target=worker, name=f"ingest-{name}-{i}", daemon=True)
+            for i in range(self.workers[name])
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _cleanup(self, item: _Item):
+        if item.temp_file and os.path.exists(item.temp_file):
+            os.remove(item.temp_file)
+
+    # -- stages ------------------------------------------------------------
+
+    def _fetch(self, item: _Item, events: queue.Queue) -> _Item:
+        source = item.source
+        if source.path:
+            item.value = (source.path, source.name)
+        elif source.url:
+            events.put(item.event("fetch", "started"))
+            file_path, filename = download_to_file(
+                self.processor.session, source.url, self._temp_dir, next(self._file_numbers)
+            )
+            item.value = (file_path, filename)
+            item.temp_file = file_path
+        else:
+            raise ValueError("source has neither a path nor a url")
+        events.put(item.event("fetch", "done"))
+        return item
+
+    def _convert(self, item: _Item, events: queue.Queue) -> _Item:
+        events.put(item.event("convert", "started"))
+        file_path, filename = item.value
+        try:
+            item.value = self.processor.convert_one(file_path, filename)
+        finally:
+            self._cleanup(item)
+            item.temp_file = None
+        events.put(item.event("convert", "done"))
+        return item
+
+    def _chunk(self, item: _Item, events: queue.Queue) -> Optional[_Item]:
+        converted = item.value
+        # from here on only the chunk texts are kept, not the converted document
+        item.value = self.indexer.prepare_document(converted['doc'], source_name=converted['filename'])
+        if item.value is None:
+            events.put(item.event("chunk", "skipped", detail="unchanged"))
+            return None
+        events.put(item.event("chunk", "done", chunks=len(item.value.texts)))
+        return item
+
+    def _embed(self, item: _Item, events: queue.Queue) -> _Item:
+        self.indexer.embed_document(item.value)
+        events.put(item.event("embed", "done", chunks=len(item.value.texts)))
+        return item
+
+    def _upsert(self, item: _Item, events: queue.Queue) -> None:
+        written = self.indexer.write_document(item.value)
+        events.put(item.event("upsert", "done", chunks=written))
+        return None
+
+    # -- driver ------------------------------------------------------------
+
+    def run(self, sources: Iterable[IngestSource]) -> Iterator[IngestEvent]:
+        """Ingest `sources`, yielding progress events as they happen. Closing the iterator stops the run."""
+        self._stop.clear()
+        self._temp_dir = tempfile.mkdtemp(prefix="ingest-")
+        events = queue.Queue()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(STAGES) + 1)]
+        handlers = {
+            "fetch": self._fetch, "convert": self._convert, "chunk": self._chunk,
+            "embed": self._embed, "upsert": self._upsert,
+        }
+
+        threads = []
+        for i, name in enumerate(STAGES):
+            handler = handlers[name]
+            threads += self._start_stage(name, lambda item, h=handler: h(item, events), queues[i], queues[i + 1], events)
+
+        def feed():
+            for index, source in enumerate(sources):
+                if not self._put(queues[0], _Item(source, index)):
+                    return
+            self._put(queues[0], _DONE)
+
+        threads.append(threading.Thread(target=feed, name="ingest-feed", daemon=True))
+        threads[-1].start()
+
+        def finish():
+            # the last stage passes nothing on; its end marker means everything is done
+            self._get(queues[-1])
+            events.put(_DONE)
+
+        threads.append(threading.Thread(target=finish, name="ingest-finish", daemon=True))
+        threads[-1].start()
+
+        try:
+            while True:
+                event = events.get()
+                if event is _DONE:
+                    break
+                yield event
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join(timeout=5)
+            shutil.rmtree(self._temp_dir, ignore_errors=True)
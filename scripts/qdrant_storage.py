@@ -0,0 +1,117 @@
+"""
+Inspect the storage layout of the Qdrant collection, migrate it to the configured one
+(QDRANT_QUANTIZATION, QDRANT_ON_DISK, QDRANT_HNSW_M, ...) and measure the recall of the
+configured search against exact search.
+
+    python -m scripts.qdrant_storage show
+    QDRANT_QUANTIZATION=scalar QDRANT_ON_DISK=true python -m scripts.qdrant_storage apply --wait
+    python -m scripts.qdrant_storage recall --queries 200 --k 20 --min-recall 0.95
+"""
+import sys
+import time
+import argparse
+import logging
+
+from app.core.retriever import COLLECTION_NAME
+from app.core.vector_store import QdrantVectorStore, QdrantStorageConfig
+
+_log = logging.getLogger(__name__)
+
+
+def stored_config(info: dict) -> QdrantStorageConfig:
+    """The layout a collection has now, as far as the memory estimate needs it"""
+    quantization = info["quantization"] if info["quantization"] in ("scalar", "binary") else "none"
+    return QdrantStorageConfig(
+        quantization=quantization, on_disk=info["on_disk"], on_disk_payload=info["on_disk_payload"],
+        hnsw_m=info["hnsw"]["m"], hnsw_ef_construct=info["hnsw"]["ef_construct"]
+    )
+
+
+def wait_until_green(store: QdrantVectorStore, timeout: float, poll: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if store.collection_info()["status"] == "green":
+            return True
+        time.sleep(poll)
+    return False
+
+
+def sample_query_vectors(store: QdrantVectorStore, count: int):
+    # point ids are content hashes, so the first points by id are an unbiased sample
+    records, _ = store.client.scroll(
+        collection_name=store.collection_name, limit=count, with_vectors=True, with_payload=False
+    )
+    return [record.vector for record in records]
+
+
+def measure_recall(store: QdrantVectorStore, vectors, k: int) -> dict:
+    """recall@k of the configured (approximate, possibly quantized) search against exact search"""
+    start = time.perf_counter()
+    approximate = store.search_batch(vectors, k)
+    approximate_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    exact = store.search_batch(vectors, k, exact=True)
+    exact_seconds = time.perf_counter() - start
+
+    recalls = []
+    for approx_hits, exact_hits in zip(approximate, exact):
+        if exact_hits:
+            expected = {hit.id for hit in exact_hits}
+            recalls.append(len(expected & {hit.id for hit in approx_hits}) / len(expected))
+    return {
+        "queries": len(recalls),
+        "k": k,
+        "recall": sum(recalls) / len(recalls) if recalls else None,
+        "min_recall": min(recalls) if recalls else None,
+        "approximate_ms_per_query": 1000 * approximate_seconds / max(1, len(vectors)),
+        "exact_ms_per_query": 1000 * exact_seconds / max(1, len(vectors)),
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", default=COLLECTION_NAME)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("show", help="current layout and estimated memory, now and under the configured layout")
+    apply = commands.add_parser("apply", help="migrate the collection to the configured layout")
+    apply.add_argument("--wait", action="store_true", help="wait until Qdrant has finished re-indexing")
+    apply.add_argument("--timeout", type=float, default=3600.0)
+    recall = commands.add_parser("recall", help="recall@k of the configured search against exact search")
+    recall.add_argument("--queries", type=int, default=200, help="stored vectors used as queries")
+    recall.add_argument("--k", type=int, default=20)
+    recall.add_argument("--min-recall", type=float, default=0.0, help="exit with an error below this recall")
+    args = parser.parse_args()
+
+    store = QdrantVectorStore(args.collection)
+    try:
+        info = store.collection_info()
+        if args.command == "show":
+            info["estimated_memory"] = stored_config(info).estimate_memory(info["points"], info["dimension"])
+            info["configured"] = vars(store.config)
+            info["configured_memory"] = store.config.estimate_memory(info["points"], info["dimension"])
+            _log.info(info)
+
+        elif args.command == "apply":
+            before = stored_config(info).estimate_memory(info["points"], info["dimension"])
+            store.apply_config()
+            after = store.config.estimate_memory(info["points"], info["dimension"])
+            _log.info(f"Applied {vars(store.config)} to '{args.collection}'; "
+                      f"estimated RAM {before['ram'] / 1024 ** 2:.1f} MB -> {after['ram'] / 1024 ** 2:.1f} MB")
+            if args.wait and not wait_until_green(store, args.timeout):
+                _log.error(f"Collection did not finish re-indexing within {args.timeout:.0f}s")
+                sys.exit(1)
+            _log.info(store.collection_info())
+
+        elif args.command == "recall":
+            report = measure_recall(store, sample_query_vectors(store, args.queries), args.k)
+            _log.info(report)
+            if report["recall"] is not None and report["recall"] < args.min_recall:
+                _log.error(f"recall@{args.k} {report['recall']:.4f} is below {args.min_recall}")
+                sys.exit(1)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import re
+from pathlib import Path
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("docling_core")
+
+from scripts.adaptive_convert import classify_pages, convert_adaptive  # noqa: E402
+
+PAPERS = sorted((Path(__file__).resolve().parent.parent / "data/arxiv_papers").glob("*.pdf"))
+# longer runs of letters than any real word: words glued together
+GLUED_RE = re.compile(r"[A-Za-z]{25,}")
+
+
+def no_docling():
+    raise AssertionError("the text layer path must not load Docling")
+
+
+@pytest.mark.parametrize("pdf_path", PAPERS, ids=lambda path: path.name)
+def test_text_layer_keeps_spaces_between_words(pdf_path):
+    with fitz.open(pdf_path) as pdf:
+        assert not any(plan.use_docling for plan in classify_pages(pdf, "fast"))
+        plain = " ".join(page.get_text() for page in pdf)
+
+    doc = convert_adaptive(no_docling, str(pdf_path), profile="fast")
+    text = " ".join(item.text for item in doc.texts)
+
+    assert len(GLUED_RE.findall(text)) <= len(GLUED_RE.findall(plain))
+    # nothing the plain text layer has is lost
+    assert len(text.split()) >= 0.95 * len(plain.split())
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        convert_adaptive(no_docling, str(PAPERS[0]), profile="fastest")
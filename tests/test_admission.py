@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from app.core.admission import AdmissionController, QueueFullError
+
+
+def controller(max_concurrency=1, max_queue=2):
+    return AdmissionController(max_concurrency, max_queue, priorities={"interactive": 0, "batch": 10})
+
+
+def test_admits_up_to_concurrency_then_queues_by_priority():
+    async def scenario():
+        admission = controller(max_queue=3)
+        running = admission.enqueue("interactive")
+        assert running.admitted
+
+        batch = admission.enqueue("batch")
+        first = admission.enqueue("interactive")
+        second = admission.enqueue("interactive")
+        # interactive requests overtake the earlier batch one, in arrival order
+        assert [admission.position(t) for t in (first, second, batch)] == [1, 2, 3]
+
+        running.release()
+        assert first.admitted and not second.admitted and not batch.admitted
+        first.release()
+        second.release()
+        assert batch.admitted
+
+    asyncio.run(scenario())
+
+
+def test_rejects_when_queue_is_full():
+    async def scenario():
+        admission = controller(max_queue=1)
+        admission.enqueue()
+        admission.enqueue()
+        assert not admission.has_capacity()
+        with pytest.raises(QueueFullError):
+            admission.enqueue()
+        assert admission.stats()["rejected"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_unknown_priority_class():
+    with pytest.raises(ValueError):
+        controller().enqueue("bulk")
+
+
+def test_waiter_sees_position_updates_and_admission():
+    async def scenario():
+        admission = controller(max_queue=3)
+        running = admission.enqueue("interactive")
+        waiter = admission.enqueue("batch")
+        overtaking = []
+        seen = []
+
+        async def wait():
+            async for position in waiter.wait():
+                seen.append(position)
+                if not overtaking:
+                    # a higher priority arrival while this position is being handled
+                    # must not be missed
+                    overtaking.append(admission.enqueue("interactive"))
+                    await asyncio.sleep(0)
+
+        task = asyncio.create_task(wait())
+        await asyncio.sleep(0.01)
+        assert seen == [1, 2]
+
+        running.release()
+        await asyncio.sleep(0.01)
+        assert seen == [1, 2, 1]
+        assert overtaking[0].admitted and not task.done()
+
+        overtaking[0].release()
+        await asyncio.wait_for(task, timeout=1)
+        assert waiter.admitted
+
+    asyncio.run(scenario())
+
+
+def test_reservations_count_against_the_queue():
+    admission = controller(max_queue=1)
+    first = admission.reserve()
+    second = admission.reserve()
+    with pytest.raises(QueueFullError):
+        admission.reserve()
+    assert admission.stats()["reserved"] == 2
+
+    # a request that gives up before its prompt is ready frees its place
+    second.release()
+    admission.enqueue(ticket=first)
+    assert first.admitted
+    assert admission.stats()["reserved"] == 0
+    assert admission.has_capacity()
+
+
+def test_reserved_ticket_released_on_early_exit():
+    from app.core.inference import _generate
+
+    async def scenario():
+        admission = controller()
+        ticket = admission.reserve()
+        # nothing retrieved, so no generation and no queueing
+        tokens = [token async for token in _generate("question", [], None, retrieved=(None, []), ticket=ticket)]
+        assert tokens == ["Sorry, I couldn't find relevant information."]
+        assert ticket.released
+        assert admission.stats()["reserved"] == 0
+
+    asyncio.run(scenario())
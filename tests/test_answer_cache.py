@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from app.core import collection_version
+from app.core.answer_cache import SemanticAnswerCache
+
+
+@pytest.fixture(autouse=True)
+def version_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(collection_version, "VERSION_DIR", str(tmp_path))
+
+
+def test_similar_query_over_same_chunks_hits():
+    cache = SemanticAnswerCache(maxsize=8, threshold=0.95)
+    cache.store([1.0, 0.0, 0.0], ["b", "a"], "papers", "cached answer")
+
+    # chunk order does not matter, a near-identical query does
+    assert cache.lookup([0.99, 0.05, 0.0], ["a", "b"], "papers") == "cached answer"
+    assert cache.lookup([0.0, 1.0, 0.0], ["a", "b"], "papers") is None
+    # same query, different retrieved chunks or collection
+    assert cache.lookup([1.0, 0.0, 0.0], ["a", "c"], "papers") is None
+    assert cache.lookup([1.0, 0.0, 0.0], ["a", "b"], "notes") is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_collection_change_drops_its_entries():
+    cache = SemanticAnswerCache(maxsize=8)
+    cache.store([1.0, 0.0], ["a"], "papers", "papers answer")
+    cache.store([1.0, 0.0], ["a"], "notes", "notes answer")
+
+    collection_version.bump_collection_version("papers")
+    assert cache.lookup([1.0, 0.0], ["a"], "papers") is None
+    assert cache.lookup([1.0, 0.0], ["a"], "notes") == "notes answer"
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SemanticAnswerCache(maxsize=2)
+    cache.store([1.0, 0.0], ["a"], "papers", "a")
+    cache.store([1.0, 0.0], ["b"], "papers", "b")
+    assert cache.lookup([1.0, 0.0], ["a"], "papers") == "a"
+
+    cache.store([1.0, 0.0], ["c"], "papers", "c")
+    assert cache.lookup([1.0, 0.0], ["b"], "papers") is None
+    assert cache.lookup([1.0, 0.0], ["a"], "papers") == "a"
+    assert cache.stats()["size"] == 2
+
+
+def test_expired_entries_are_dropped(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.core.answer_cache.time.monotonic", lambda: now[0])
+    cache = SemanticAnswerCache(maxsize=8, ttl=60)
+    cache.store(np.ones(4), ["a"], "papers", "answer")
+
+    now[0] += 30
+    assert cache.lookup(np.ones(4), ["a"], "papers") == "answer"
+    now[0] += 31
+    assert cache.lookup(np.ones(4), ["a"], "papers") is None
+    assert cache.stats()["size"] == 0
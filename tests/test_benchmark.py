@@ -0,0 +1,38 @@
+import asyncio
+
+import httpx
+
+from app.core.stream_markers import render_queue_marker
+from benchmarks.run_benchmark import compare, one_request, percentile
+
+
+def test_percentile_interpolates():
+    assert percentile([], 50) is None
+    assert percentile([4, 1, 3, 2], 50) == 2.5
+    assert percentile([1, 2, 3], 100) == 3
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = {"ttft_p50": 1.0, "latency_p95": 2.0, "throughput_rps": 10.0, "errors": 0}
+    summary = {"ttft_p50": 1.05, "latency_p95": 2.5, "throughput_rps": 8.0, "errors": 1}
+
+    regressions = compare(summary, baseline, tolerance=0.10)
+
+    assert [line.split(":")[0] for line in regressions] == ["latency_p95", "throughput_rps", "errors"]
+
+
+def test_one_request_counts_answer_text_sharing_a_chunk_with_a_marker():
+    async def scenario():
+        async def body():
+            yield (render_queue_marker(2) + render_queue_marker(1)).encode()
+            yield (render_queue_marker(1) + "Hello").encode()
+            yield b" world"
+
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body()))
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await one_request(client, "question")
+
+    sample = asyncio.run(scenario())
+    assert sample["ok"]
+    assert sample["chars"] == len("Hello world")
+    assert sample["ttft"] is not None
@@ -0,0 +1,133 @@
+import asyncio
+
+from app.core.coalescing import SingleFlight
+
+
+def test_joiner_gets_replayed_items_and_shares_one_producer():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def producer():
+            calls.append(1)
+            yield "a"
+            await release.wait()
+            yield "b"
+
+        async def collect(started=None):
+            items = []
+            async for item in flights.subscribe("key", producer):
+                items.append(item)
+                if started is not None:
+                    started.set()
+            return items
+
+        first_started = asyncio.Event()
+        first = asyncio.create_task(collect(first_started))
+        await first_started.wait()
+        # joins after "a" was produced
+        second = asyncio.create_task(collect())
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await first == ["a", "b"]
+        assert await second == ["a", "b"]
+        assert len(calls) == 1
+        assert flights.stats() == {"in_flight": 0, "subscribers": 0, "started": 1, "joined": 1}
+
+    asyncio.run(scenario())
+
+
+def test_producer_error_reaches_every_subscriber():
+    async def scenario():
+        flights = SingleFlight()
+
+        async def producer():
+            yield "a"
+            raise RuntimeError("upstream failed")
+
+        async def collect():
+            return [item async for item in flights.subscribe("key", producer)]
+
+        results = await asyncio.gather(collect(), collect(), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+    asyncio.run(scenario())
+
+
+def test_producer_cancelled_when_last_subscriber_leaves():
+    async def scenario():
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def producer():
+            try:
+                yield "a"
+                await asyncio.sleep(10)
+                yield "b"
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        subscribers = [flights.subscribe("key", producer) for _ in range(2)]
+        for subscriber in subscribers:
+            assert await subscriber.__anext__() == "a"
+
+        await subscribers[0].aclose()
+        await asyncio.sleep(0)
+        assert not cancelled.is_set()
+
+        await subscribers[1].aclose()
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        # the key is free again, so a new request starts afresh
+        assert flights.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_different_keys_do_not_share():
+    async def scenario():
+        flights = SingleFlight()
+
+        def producer_for(value):
+            async def producer():
+                yield value
+            return producer
+
+        results = await asyncio.gather(
+            *(collect_all(flights.subscribe(key, producer_for(key))) for key in ("x", "y"))
+        )
+        assert results == [["x"], ["y"]]
+
+    asyncio.run(scenario())
+
+
+async def collect_all(stream):
+    return [item async for item in stream]
+
+
+def test_superseded_transient_items_are_not_replayed():
+    async def scenario():
+        flights = SingleFlight(transient=lambda item: isinstance(item, int))
+        release = asyncio.Event()
+        produced = asyncio.Event()
+
+        async def producer():
+            yield 2
+            yield 1
+            produced.set()
+            await release.wait()
+            yield "a"
+
+        first = asyncio.create_task(collect_all(flights.subscribe("key", producer)))
+        await produced.wait()
+        # joins while still queued: only the current position is shown
+        second = asyncio.create_task(collect_all(flights.subscribe("key", producer)))
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await second == [1, "a"]
+        assert (await first)[-2:] == [1, "a"]
+
+    asyncio.run(scenario())
@@ -0,0 +1,47 @@
+from app.core.context import ContextBuilder, TokenCounter, SAFETY_MARGIN
+from app.core.vector_store import SearchHit
+
+
+def hit(point_id, words, score=0.9):
+    return SearchHit(id=point_id, score=score, payload={"content": " ".join(f"{point_id}w{i}" for i in range(words))})
+
+
+def builder(num_ctx=1024, num_predict=128):
+    return ContextBuilder(counter=TokenCounter(""), num_ctx=num_ctx, num_predict=num_predict, system_prompt="System.")
+
+
+def test_prompt_stays_within_budget():
+    context_builder = builder()
+    hits = [hit(str(i), 120) for i in range(20)]
+    history = [(f"question {i} " * 20, f"answer {i} " * 40) for i in range(10)]
+
+    built = context_builder.build("What is DPO?", hits, history)
+
+    assert context_builder.budget == 1024 - 128 - SAFETY_MARGIN
+    assert context_builder.counter.count(built.prompt) <= context_builder.budget
+    # chunks are used in rank order until the budget runs out
+    assert 0 < len(built.chunk_ids) < len(hits)
+    assert built.chunk_ids == [str(i) for i in range(len(built.chunk_ids))]
+    assert built.stats["history_turns_dropped"] > 0
+
+
+def test_low_scoring_and_duplicate_chunks_are_dropped():
+    context_builder = builder(num_ctx=8192)
+    duplicate = SearchHit(id="dup", score=0.9, payload=dict(hit("a", 50).payload))
+    hits = [hit("a", 50), duplicate, hit("b", 50, score=0.05), hit("c", 50)]
+
+    built = context_builder.build("question", hits)
+
+    assert built.chunk_ids == ["a", "c"]
+
+
+def test_history_keeps_newest_turns_and_summarizes_the_rest():
+    context_builder = builder()
+    history = [(f"q{i}", "a" * 200) for i in range(5)]
+
+    text, used, dropped = context_builder.fit_history(history, budget=150)
+
+    assert used <= 150
+    assert dropped > 0
+    assert text.startswith("Earlier the user asked: q0")
+    assert text.rstrip().endswith("a" * 200)
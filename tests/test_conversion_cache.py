@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+pytest.importorskip("docling_core")
+from docling_core.types.doc import DocItemLabel, DoclingDocument
+
+from scripts.conversion_cache import ConversionCache
+
+
+def document(text):
+    doc = DoclingDocument(name="paper")
+    doc.add_text(label=DocItemLabel.TEXT, text=text)
+    return doc
+
+
+def pdf(tmp_path, name, content):
+    path = tmp_path / name
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_same_bytes_under_another_name_hit(tmp_path):
+    cache = ConversionCache("opts", cache_dir=str(tmp_path / "cache"))
+    key = cache.key(pdf(tmp_path, "paper.pdf", b"%PDF-1.7 same"))
+    assert cache.get(key) is None
+
+    cache.put(key, document("converted once"))
+    assert cache.key(pdf(tmp_path, "renamed.pdf", b"%PDF-1.7 same")) == key
+    assert cache.get(key).export_to_markdown() == "converted once"
+    # other bytes or other pipeline options are other entries
+    assert cache.key(pdf(tmp_path, "other.pdf", b"%PDF-1.7 other")) != key
+    assert ConversionCache("other-opts", cache_dir=str(tmp_path / "cache")).key(
+        pdf(tmp_path, "paper.pdf", b"%PDF-1.7 same")) != key
+
+
+def test_unreadable_entry_is_dropped(tmp_path):
+    cache = ConversionCache("opts", cache_dir=str(tmp_path / "cache"))
+    key = cache.key(pdf(tmp_path, "paper.pdf", b"%PDF-1.7"))
+    cache.put(key, document("text"))
+    cache._path(key).write_bytes(b"not gzip")
+
+    assert cache.get(key) is None
+    assert not cache._path(key).exists()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = ConversionCache("opts", cache_dir=str(tmp_path / "cache"))
+    keys = [cache.key(pdf(tmp_path, f"{i}.pdf", f"%PDF-1.7 {i}".encode())) for i in range(3)]
+    for age, key in zip((300, 200, 100), keys):
+        cache.put(key, document(f"text {key}"))
+        os.utime(cache._path(key), (os.path.getmtime(cache._path(key)) - age,) * 2)
+
+    # a hit makes the oldest entry the most recently used
+    assert cache.get(keys[0]) is not None
+    entry_size = cache._path(keys[0]).stat().st_size
+    cache.max_bytes = 2 * entry_size + entry_size // 2
+    cache.evict()
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+    assert cache.stats()["entries"] == 2
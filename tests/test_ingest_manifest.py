@@ -0,0 +1,41 @@
+from scripts.ingest_manifest import IngestManifest
+
+
+def manifest(tmp_path):
+    return IngestManifest("papers", manifest_dir=str(tmp_path))
+
+
+def test_different_paper_under_the_same_name_is_not_a_revision(tmp_path):
+    entries = manifest(tmp_path)
+    entries.set("hash-a", "paper.pdf", ["a1", "a2", "a3", "a4"])
+
+    # shares no chunks with the indexed paper.pdf
+    assert entries.predecessor("paper.pdf", ["b1", "b2", "b3"]) is None
+    entries.set("hash-b", "paper.pdf", ["b1", "b2", "b3"])
+    assert set(entries.entries) == {"hash-a", "hash-b"}
+    assert entries.referenced_ids() == {"a1", "a2", "a3", "a4", "b1", "b2", "b3"}
+
+
+def test_revision_replaces_the_earlier_version(tmp_path):
+    entries = manifest(tmp_path)
+    entries.set("v1", "paper.pdf", ["c1", "c2", "c3", "c4"])
+    entries.set("other", "notes.pdf", ["c1", "n1"])
+
+    revised = ["c1", "c2", "c3", "c5"]
+    # same chunks under another name are not a revision of it
+    assert entries.predecessor("paper-v2.pdf", revised) is None
+    assert entries.predecessor("paper.pdf", revised) == "v1"
+    # what the revision drops, minus what other documents still use
+    assert entries.referenced_ids(exclude="v1") == {"c1", "n1"}
+
+    entries.set("v2", "paper.pdf", revised, replaces="v1")
+    reloaded = manifest(tmp_path)
+    assert set(reloaded.entries) == {"v2", "other"}
+    assert reloaded.get("v2") == {"source_name": "paper.pdf", "point_ids": sorted(revised)}
+
+
+def test_predecessor_needs_enough_shared_chunks(tmp_path):
+    entries = manifest(tmp_path)
+    entries.set("v1", "paper.pdf", ["c1", "c2", "c3", "c4"])
+    assert entries.predecessor("paper.pdf", ["c1", "x1", "x2", "x3"]) is None
+    assert entries.predecessor("paper.pdf", ["c1", "c2", "x1"]) == "v1"
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from app.core.vector_store import LocalVectorStore, VectorStore
+
+DIM = 8
+
+
+def vector(seed):
+    return np.random.default_rng(seed).normal(size=DIM).astype(np.float32)
+
+
+def store(tmp_path, index_type="flat"):
+    return LocalVectorStore("papers", root=str(tmp_path), index_type=index_type)
+
+
+def seeded(tmp_path, index_type="flat", count=20):
+    writer = store(tmp_path, index_type)
+    writer.ensure_collection(DIM)
+    writer.upsert([str(i) for i in range(count)], [vector(i) for i in range(count)],
+                  [{"content": f"chunk {i}"} for i in range(count)])
+    return writer
+
+
+def test_incomplete_backend_fails_on_instantiation():
+    class NoSearch(VectorStore):
+        def ensure_collection(self, dimension):
+            return False
+
+    with pytest.raises(TypeError):
+        NoSearch("papers")
+
+
+def test_search_retrieve_and_replace(tmp_path):
+    writer = seeded(tmp_path)
+
+    hits = writer.search(vector(3), 3)
+    assert hits[0].id == "3"
+    assert hits[0].payload == {"content": "chunk 3"}
+    assert hits[0].score == pytest.approx(1.0)
+
+    writer.upsert(["3"], [vector(100)], [{"content": "replaced"}])
+    assert writer.search(vector(100), 1)[0].payload == {"content": "replaced"}
+    assert {"content": "chunk 3"} not in [hit.payload for hit in writer.search(vector(3), 20)]
+    assert [hit.payload for hit in writer.retrieve(["3", "missing"])] == [{"content": "replaced"}]
+
+
+def test_deleted_rows_are_masked(tmp_path):
+    writer = seeded(tmp_path)
+    writer.delete(["5", "missing"])
+    assert "5" not in [hit.id for hit in writer.search(vector(5), 20)]
+    assert writer.retrieve(["5"]) == []
+
+
+def test_writes_reach_other_instances(tmp_path):
+    writer = seeded(tmp_path)
+    reader = store(tmp_path)
+    assert reader.search(vector(7), 1)[0].id == "7"
+
+    writer.upsert(["new"], [vector(200)], [{"content": "new"}])
+    writer.delete(["7"])
+    assert reader.search(vector(200), 1)[0].id == "new"
+    assert reader.retrieve(["7"]) == []
+
+
+def test_compaction_keeps_live_rows(tmp_path):
+    writer = seeded(tmp_path)
+    reader = store(tmp_path)
+    reader.search(vector(0), 1)
+    generation = writer._generation
+
+    # more than half the rows dead triggers a compaction into a new generation
+    writer.delete([str(i) for i in range(12)])
+    assert writer._generation != generation
+    for current in (writer, reader):
+        assert {hit.id for hit in current.search(vector(15), 20)} == {str(i) for i in range(12, 20)}
+        assert current.search(vector(15), 1)[0].id == "15"
+
+
+@pytest.mark.parametrize("index_type", ["hnsw", "ivf"])
+def test_ann_index_follows_appends_and_deletes(tmp_path, index_type):
+    pytest.importorskip("faiss")
+    writer = seeded(tmp_path, index_type, count=50)
+    assert writer.search(vector(10), 1)[0].id == "10"
+
+    # appended after the index was built, then picked up without a rebuild
+    writer.upsert(["late"], [vector(300)], [{"content": "late"}])
+    writer.delete(["10"])
+    reader = store(tmp_path, index_type)
+    for current in (writer, reader):
+        assert current.search(vector(300), 1)[0].id == "late"
+        assert "10" not in [hit.id for hit in current.search(vector(10), 5)]
+        assert current.search(vector(10), 1, exact=True)[0].id != "10"
@@ -0,0 +1,92 @@
+import numpy as np
+
+from app.core.embeddings import EmbeddingBackend
+from app.core.retriever import QueryEmbeddingCache, Retriever, reciprocal_rank_fusion
+from app.core.sparse_index import BM25Index
+from app.core.vector_store import LocalVectorStore
+
+
+def test_rrf_rewards_agreement_between_rankings():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "d"]], k=60)
+    ids = [point_id for point_id, _ in fused]
+    assert ids[0] == "b"
+    assert set(ids) == {"a", "b", "c", "d"}
+    scores = dict(fused)
+    assert scores["b"] == 1 / 62 + 1 / 61
+    assert scores["a"] > scores["c"]
+
+
+def test_rrf_of_nothing():
+    assert reciprocal_rank_fusion([[], []]) == []
+
+
+def test_bm25_ranks_matching_chunks(tmp_path):
+    index = BM25Index("papers", index_dir=str(tmp_path))
+    index.add("1", "Direct preference optimization aligns language models")
+    index.add("2", "Proximal policy optimization is a reinforcement learning method")
+    index.add("3", "We evaluate on gpt-4 outputs")
+    assert [point_id for point_id, _ in index.search("preference optimization", 3)][0] == "1"
+    assert index.search("gpt-4", 3)[0][0] == "3"
+    index.remove("1")
+    assert "1" not in [point_id for point_id, _ in index.search("preference", 3)]
+
+
+def test_bm25_changes_reach_other_instances(tmp_path):
+    writer = BM25Index("papers", index_dir=str(tmp_path))
+    writer.clear()
+    writer.save()
+    reader = BM25Index("papers", index_dir=str(tmp_path))
+
+    writer.add("1", "retrieval augmented generation")
+    writer.save()
+    assert reader.search("retrieval", 1)[0][0] == "1"
+
+    writer.add("1", "dense passage retrieval")
+    writer.add("2", "generation quality")
+    writer.remove("2")
+    writer.save()
+    assert reader.search("generation", 5) == []
+    assert len(reader) == 1
+
+
+class FakeEmbedder(EmbeddingBackend):
+    name = "fake"
+
+    def __init__(self):
+        super().__init__("fake")
+        self.dimension = 4
+
+    def encode(self, texts, batch_size=64):
+        return np.array([[1.0, 0.0, 0.0, 0.0] for _ in texts], dtype=np.float32)
+
+
+class CountingStore(LocalVectorStore):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.retrieve_calls = 0
+
+    def retrieve(self, ids):
+        self.retrieve_calls += 1
+        return super().retrieve(ids)
+
+
+def test_search_batch_fetches_sparse_only_hits_in_one_call(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = CountingStore("papers", root=str(tmp_path / "store"))
+    store.ensure_collection(4)
+    # "near" chunks win the dense search, the lexical index alone finds the "term" ones
+    store.upsert(["near1", "near2", "term1", "term2"],
+                 [[1, 0, 0, 0], [1, 0.1, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0]],
+                 [{"content": "near"}, {"content": "near"}, {"content": "alpha"}, {"content": "beta"}])
+    retriever = Retriever(top_k=2, cache=QueryEmbeddingCache(0), embedder=FakeEmbedder(), store=store)
+    monkeypatch.setattr("app.core.retriever.HYBRID_CANDIDATES_PER_SLOT", 1)
+    retriever.sparse_index.add("term1", "alpha")
+    retriever.sparse_index.add("term2", "beta")
+
+    results = retriever.search_batch(["alpha", "beta"])
+
+    assert store.retrieve_calls == 1
+    assert [{hit.id for hit in hits} for _, hits in results] == [{"near1", "term1"}, {"near1", "term2"}]
+    by_id = {hit.id: hit for hit in results[0][1]}
+    assert by_id["near1"].score is not None
+    assert by_id["term1"].score is None and by_id["term1"].payload == {"content": "alpha"}
@@ -0,0 +1,29 @@
+from app.core.stream_markers import QueueMarkerParser, render_queue_marker
+
+
+def parse(stream, chunk_size):
+    parser = QueueMarkerParser()
+    text = ""
+    positions = []
+    for start in range(0, len(stream), chunk_size):
+        chunk_text, chunk_positions = parser.feed(stream[start:start + chunk_size])
+        text += chunk_text
+        positions += chunk_positions
+    return text + parser.flush(), positions
+
+
+def test_markers_are_stripped_whatever_the_chunking():
+    stream = render_queue_marker(2) + render_queue_marker(1) + "Hello world"
+    for chunk_size in (1, 2, 5, len(stream)):
+        assert parse(stream, chunk_size) == ("Hello world", [2, 1])
+
+
+def test_marker_glued_to_answer_text():
+    stream = "Hel" + render_queue_marker(3) + "lo"
+    assert parse(stream, 4) == ("Hello", [3])
+
+
+def test_record_separator_that_is_not_a_marker_is_kept():
+    assert parse("a\x1eb\x1equeue:x\n", 1) == ("a\x1eb\x1equeue:x\n", [])
+    # an unfinished marker at the end of the stream is returned as text
+    assert parse("done\x1equeue:4", 3) == ("done\x1equeue:4", [])